@@ -14,6 +14,10 @@ class Settings(BaseSettings):
     INVENTORY_SERVICE_URL: str = os.getenv("INVENTORY_SERVICE_URL", "http://inventory-service:8000/api/v1/inventory")
     ORDER_SERVICE_URL: str = os.getenv("ORDER_SERVICE_URL", "http://order-service:8000/api/v1/orders")
     ANALYTICS_SERVICE_URL: str = os.getenv("ANALYTICS_SERVICE_URL", "http://analytics-service:8000/api/v1/analytics")
+
+    # Timeouts (seconds), capped by the request deadline when one is set
+    CHAT_TIMEOUT: float = float(os.getenv("CHAT_TIMEOUT", "30"))
+    CONTEXT_TIMEOUT: float = float(os.getenv("CONTEXT_TIMEOUT", "5"))
     
     model_config = {
         "env_file": ".env",
@@ -1,9 +1,18 @@
 from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse
 from app.services.logic import AIService
+from app.core.deadline import DeadlineMiddleware, DeadlineExceeded
 from pydantic import BaseModel
 
 app = FastAPI(title="AI Service")
 
+# Honour the caller's remaining budget (X-Request-Timeout-Ms) on every request
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 class ChatRequest(BaseModel):
     message: str
     context: str = ""
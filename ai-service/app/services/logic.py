@@ -1,5 +1,6 @@
 import httpx
 from app.core.config import settings
+from app.core import deadline
 import json
 
 class AIService:
@@ -11,7 +12,11 @@ class AIService:
     async def _fetch_inventory_context(self):
         try:
             async with httpx.AsyncClient() as client:
-                resp = await client.get(settings.INVENTORY_SERVICE_URL)
+                resp = await client.get(
+                    settings.INVENTORY_SERVICE_URL,
+                    headers=deadline.propagate(),
+                    timeout=deadline.timeout(settings.CONTEXT_TIMEOUT),
+                )
                 if resp.status_code == 200:
                     products = resp.json()
                     # Summarize for token efficiency
@@ -26,7 +31,11 @@ class AIService:
     async def _fetch_analytics_context(self):
         try:
             async with httpx.AsyncClient() as client:
-                resp = await client.get(f"{settings.ANALYTICS_SERVICE_URL}/dashboard")
+                resp = await client.get(
+                    f"{settings.ANALYTICS_SERVICE_URL}/dashboard",
+                    headers=deadline.propagate(),
+                    timeout=deadline.timeout(settings.CONTEXT_TIMEOUT),
+                )
                 if resp.status_code == 200:
                     data = resp.json()
                     return json.dumps(data, indent=2)
@@ -83,7 +92,7 @@ class AIService:
                     f"{self.base_url}/chat/completions",
                     json=payload,
                     headers=headers,
-                    timeout=30.0
+                    timeout=deadline.timeout(settings.CHAT_TIMEOUT)
                 )
                 response.raise_for_status()
                 data = response.json()
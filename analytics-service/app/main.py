@@ -1,9 +1,18 @@
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.logic import AnalyticsService, get_db
+from app.core.deadline import DeadlineMiddleware, DeadlineExceeded
 
 app = FastAPI(title="Analytics Service")
 
+# Honour the caller's remaining budget (X-Request-Timeout-Ms) on every request
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 @app.get("/api/v1/analytics/dashboard")
 async def get_dashboard(db: AsyncSession = Depends(get_db)):
     service = AnalyticsService(db)
@@ -24,3 +24,10 @@ class Product(Base):
     name = Column(String)
     stock_quantity = Column(Integer)
     price = Column(Float)
+
+class ProductStockShard(Base):
+    # A sharded product keeps stock_quantity at 0 and its stock in these rows
+    __tablename__ = "product_stock_shards"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer)
@@ -1,12 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, func, desc
-from app.models.models import Order, OrderItem, Product
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, func, desc, event
+from app.models.models import Order, OrderItem, Product, ProductStockShard
 from app.core.config import settings
+from app.core import deadline
 
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+@event.listens_for(Session, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    # Queries are cancelled by Postgres once the caller's deadline has passed
+    timeout_ms = deadline.statement_timeout_ms()
+    if timeout_ms is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
@@ -27,9 +35,19 @@ class AnalyticsService:
         total_orders = sum(status_dist.values())
         pending = status_dist.get("CREATED", 0) + status_dist.get("CONFIRMED", 0)
 
-        # Low Stock
-        res_low = await self.db.execute(select(Product).where(Product.stock_quantity < 10))
-        low_stock = res_low.scalars().all()
+        # Low Stock: a product's stock is its own column plus any shard rows
+        shards = (
+            select(ProductStockShard.product_id, func.sum(ProductStockShard.quantity).label("quantity"))
+            .group_by(ProductStockShard.product_id)
+            .subquery()
+        )
+        stock = (Product.stock_quantity + func.coalesce(shards.c.quantity, 0)).label("stock_quantity")
+        res_low = await self.db.execute(
+            select(Product.id, Product.name, Product.price, stock)
+            .outerjoin(shards, shards.c.product_id == Product.id)
+            .where(stock < 10)
+        )
+        low_stock = res_low.all()
         
         # Top Selling
         stmt = (
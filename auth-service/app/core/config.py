@@ -15,6 +15,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Accept the gateway's signed X-Verified-Identity instead of decoding the JWT again
+    TRUST_GATEWAY_IDENTITY: bool = True
+    INTERNAL_IDENTITY_SECRET: str = "" # Falls back to SECRET_KEY
     
     model_config = {
         "env_file": ".env",
@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
+from app.core import deadline
 
 # Use PostgreSQL Async Engine
 engine = create_async_engine(
@@ -14,6 +16,13 @@ AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+@event.listens_for(Session, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    # Queries are cancelled by Postgres once the caller's deadline has passed
+    timeout_ms = deadline.statement_timeout_ms()
+    if timeout_ms is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
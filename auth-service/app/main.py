@@ -1,8 +1,10 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.auth import routes as auth_routes
 from app.db.base import Base
 from app.db.session import engine
+from app.core.deadline import DeadlineMiddleware, DeadlineExceeded
 import logging
 
 # Configure Logging
@@ -15,6 +17,13 @@ app = FastAPI(
     docs_url="/docs/auth"
 )
 
+# Honour the caller's remaining budget (X-Request-Timeout-Ms) on every request
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # Include Auth Routes
 app.include_router(auth_routes.router, prefix="/api/v1/auth", tags=["auth"])
 
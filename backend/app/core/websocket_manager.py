@@ -1,26 +1,343 @@
-from typing import List
+import asyncio
+import json
+import logging
+import os
+import time
 from fastapi import WebSocket
 
+logger = logging.getLogger(__name__)
+
+# Messages buffered per connection before it counts as a slow consumer
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+# "drop": discard the connection's oldest queued message; "disconnect": close it
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop")
+# A connection that drops this many messages in a row is closed anyway
+WS_MAX_DROPPED = int(os.getenv("WS_MAX_DROPPED", "1000"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Liveness: a {"type": "ping"} goes out every interval; a connection that has
+# sent nothing (e.g. "pong") for interval + timeout is closed. 0 disables.
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_PONG_TIMEOUT = float(os.getenv("WS_PONG_TIMEOUT", "20"))
+WS_MAX_TOPICS = int(os.getenv("WS_MAX_TOPICS", "50"))
+
+# Subscribing to this gets every published message
+ALL_TOPICS = "*"
+
+# 1013 "Try Again Later": the client could not keep up
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# 1001 "Going Away": the client stopped answering pings
+UNRESPONSIVE_CLOSE_CODE = 1001
+
+PING_MESSAGE = json.dumps({"type": "ping"})
+
+
+def parse_topics(value: str | None) -> list:
+    """Topics from a "?topics=a,b" query parameter."""
+    return [topic.strip() for topic in (value or "").split(",") if topic.strip()]
+
+
+# Who may subscribe to what, from the connection's verified claims (None when
+# anonymous). Stock topics are public; "user:<id>" carries that user's own
+# order events; the feeds spanning every customer ("orders", "order:<id>",
+# "dashboard", "*") are for superusers only.
+PUBLIC_TOPIC_PREFIXES = ("stock:", "product:")
+
+
+def topic_allowed(topic: str, identity: dict | None) -> bool:
+    if topic.startswith(PUBLIC_TOPIC_PREFIXES):
+        return True
+    if not identity:
+        return False
+    if identity.get("is_superuser"):
+        return True
+    return identity.get("id") is not None and topic == f"user:{identity['id']}"
+
+
+def default_topics(identity: dict | None) -> list:
+    """What a connection that names no topics gets."""
+    if identity and identity.get("is_superuser"):
+        return [ALL_TOPICS]
+    if identity and identity.get("id") is not None:
+        return [f"user:{identity['id']}", "stock:low"]
+    return ["stock:low"]
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, client_id=None, identity: dict | None = None):
+        self.websocket = websocket
+        self.client_id = client_id # A label for logs, not an identity
+        self.identity = identity
+        self.topics: set = set()
+        self.default_topics = False # Still on the implicit defaults, replaced by the first subscribe
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.dropped = 0
+        self.closing = False
+        self.last_seen = time.monotonic()
+        self.writer: asyncio.Task | None = None
+
+
 class ConnectionManager:
+    """
+    Every connection gets a bounded queue drained by its own writer task, so
+    publish() and broadcast() only enqueue: they never wait on a socket, and
+    one slow or dead client can't hold up the others.
+
+    Connections are indexed by topic ("orders", "order:42", "user:7",
+    "stock:low", "dashboard", ...), so publishing touches only subscribers.
+    Clients choose topics with ?topics=a,b when connecting, or by sending
+    {"action": "subscribe" | "unsubscribe", "topics": [...]}. Topics the
+    connection's identity may not see (topic_allowed) are refused, and so
+    are those past WS_MAX_TOPICS; the {"type": "subscriptions"} reply lists
+    them under "denied" and "rejected". A client that names none gets
+    default_topics() until its first subscribe.
+
+    The identity comes from the gateway's signed header, or from a
+    {"action": "auth", "token": ...} message, which browsers send first
+    since they can't set headers on a WebSocket (and a token in the URL
+    ends up in access logs). A connection can't change identity once set.
+    """
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.connections: dict = {} # WebSocket -> _Connection
+        self.topics: dict = {} # topic -> set of _Connection
+        self._heartbeat: asyncio.Task | None = None
 
-    async def connect(self, websocket: WebSocket):
+        # Metrics
+        self.broadcasts = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    @property
+    def active_connections(self) -> list:
+        return list(self.connections)
+
+    async def connect(self, websocket: WebSocket, client_id=None, topics=(), identity: dict | None = None):
+        """identity: the caller's verified claims, None if anonymous."""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = _Connection(websocket, client_id, identity)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.connections[websocket] = connection
+        denied, rejected = self._subscribe(connection, list(topics) or default_topics(identity))
+        connection.default_topics = not topics
+        if denied or rejected:
+            self._confirm(connection, denied, rejected)
+        if WS_PING_INTERVAL > 0 and (self._heartbeat is None or self._heartbeat.done()):
+            self._heartbeat = asyncio.create_task(self._ping_loop())
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._remove(connection)
+            if connection.writer is not None:
+                connection.writer.cancel()
+
+    def _remove(self, connection: _Connection):
+        if self.connections.get(connection.websocket) is connection:
+            del self.connections[connection.websocket]
+        self._unsubscribe(connection, list(connection.topics))
+
+    def _subscribe(self, connection: _Connection, topics: list) -> tuple:
+        """
+        Subscribe to what the connection may see. Returns (denied, rejected):
+        the topics it may not see, and those over WS_MAX_TOPICS.
+        """
+        if connection.default_topics:
+            connection.default_topics = False
+            self._unsubscribe(connection, list(connection.topics))
+        denied, rejected = [], []
+        for topic in topics:
+            if not topic_allowed(topic, connection.identity):
+                denied.append(topic)
+                continue
+            if topic not in connection.topics and len(connection.topics) >= WS_MAX_TOPICS:
+                rejected.append(topic)
+                continue
+            connection.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(connection)
+        return denied, rejected
+
+    def _confirm(self, connection: _Connection, denied=(), rejected=()):
+        self._offer(connection, json.dumps({
+            "type": "subscriptions",
+            "topics": sorted(connection.topics),
+            "denied": list(denied),
+            "rejected": list(rejected),
+        }))
+
+    def _unsubscribe(self, connection: _Connection, topics: list):
+        for topic in topics:
+            connection.topics.discard(topic)
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def subscribe(self, websocket: WebSocket, topics) -> tuple:
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return [], []
+        return self._subscribe(connection, list(topics))
+
+    def unsubscribe(self, websocket: WebSocket, topics):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._unsubscribe(connection, list(topics))
+
+    def touch(self, websocket: WebSocket):
+        """Call for every message received: the client is alive."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def _authenticate(self, connection: _Connection, identity: dict | None):
+        if identity is not None and connection.identity is None:
+            connection.identity = identity
+            if connection.default_topics:
+                # Swap the anonymous defaults for this identity's
+                self._subscribe(connection, default_topics(identity))
+                connection.default_topics = True
+        self._offer(connection, json.dumps(
+            {"type": "auth", "authenticated": connection.identity is not None, "topics": sorted(connection.topics)}
+        ))
+
+    def handle_message(self, websocket: WebSocket, text: str, verify_token=None):
+        """
+        Feed every message the client sends: liveness, auth and
+        subscribe/unsubscribe. verify_token(token) returns the token's claims,
+        or None when it isn't valid.
+        """
+        self.touch(websocket)
+        if not text.startswith("{"):
+            return # "pong" and anything else
+        try:
+            command = json.loads(text)
+            action = command["action"]
+            if action == "auth":
+                token = command["token"]
+                connection = self.connections.get(websocket)
+                if connection is not None:
+                    identity = verify_token(token) if verify_token and isinstance(token, str) else None
+                    self._authenticate(connection, identity)
+                return
+            topics = [str(topic) for topic in command["topics"]]
+        except (ValueError, TypeError, KeyError):
+            return
+        denied, rejected = [], []
+        if action == "subscribe":
+            denied, rejected = self.subscribe(websocket, topics)
+        elif action == "unsubscribe":
+            self.unsubscribe(websocket, topics)
+        else:
+            return
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._confirm(connection, denied, rejected)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception:
-                # Handle disconnected clients gracefully if remove() hasn't triggered yet
-                pass
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._offer(connection, message)
+
+    async def broadcast(self, message):
+        """Queue message (str, or anything JSON-serialisable) for every connection."""
+        payload = message if isinstance(message, str) else json.dumps(message) # Serialised once
+        self.broadcasts += 1
+        for connection in list(self.connections.values()):
+            self._offer(connection, payload)
+
+    def publish(self, topics, message: dict) -> int:
+        """
+        Queue message for the subscribers of any of topics (each gets it once).
+        The topics travel in the message so relays (the gateway hub) can route
+        it too. Returns how many connections it went to.
+        """
+        topics = list(topics)
+        recipients = set(self.topics.get(ALL_TOPICS, ()))
+        for topic in topics:
+            recipients.update(self.topics.get(topic, ()))
+        self.published += 1
+        if not recipients:
+            return 0
+        payload = json.dumps({**message, "topics": topics}) # Serialised once
+        for connection in recipients:
+            self._offer(connection, payload)
+        return len(recipients)
+
+    def _offer(self, connection: _Connection, payload: str):
+        if connection.closing:
+            return
+        try:
+            connection.queue.put_nowait(payload)
+            connection.dropped = 0
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if WS_SLOW_CONSUMER_POLICY == "disconnect" or connection.dropped >= WS_MAX_DROPPED:
+            self._evict(connection, SLOW_CONSUMER_CLOSE_CODE)
+            return
+        # Newest data is the most useful to a dashboard, lose the oldest
+        connection.queue.get_nowait()
+        connection.queue.put_nowait(payload)
+        connection.dropped += 1
+        self.dropped += 1
+
+    def _evict(self, connection: _Connection, code: int):
+        connection.closing = True
+        self.evicted += 1
+        self._remove(connection)
+        # Wake the writer so it closes the socket
+        while not connection.queue.empty():
+            connection.queue.get_nowait()
+        connection.queue.put_nowait(code)
+
+    async def _writer(self, connection: _Connection):
+        websocket = connection.websocket
+        try:
+            while True:
+                message = await connection.queue.get()
+                if isinstance(message, int):
+                    logger.info(f"Closing WebSocket connection ({message}): slow or unresponsive")
+                    # A client that doesn't read won't finish the close handshake either
+                    await asyncio.wait_for(websocket.close(code=message), timeout=WS_SEND_TIMEOUT)
+                    return
+                await asyncio.wait_for(websocket.send_text(message), timeout=WS_SEND_TIMEOUT)
+                self.delivered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Dead or stuck socket: forget it, the endpoint's receive loop ends on its own
+            if not connection.closing:
+                logger.info(f"Dropping WebSocket connection: {e!r}")
+                self.evicted += 1
+        finally:
+            self._remove(connection)
+
+    async def _ping_loop(self):
+        while self.connections:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                if connection.closing:
+                    continue
+                if now - connection.last_seen > WS_PING_INTERVAL + WS_PONG_TIMEOUT:
+                    self._evict(connection, UNRESPONSIVE_CLOSE_CODE)
+                else:
+                    self._offer(connection, PING_MESSAGE)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "topics": len(self.topics),
+            "broadcasts": self.broadcasts,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "queued": sum(c.queue.qsize() for c in self.connections.values()),
+        }
 
 manager = ConnectionManager()
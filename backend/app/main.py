@@ -5,7 +5,8 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.core.database import engine, Base
 from app.api.v1 import auth, inventory, orders, suppliers, analytics, ai
-from app.core.websocket_manager import manager
+from app.core.websocket_manager import manager, parse_topics
+from app.core import security
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,13 +40,27 @@ app.include_router(suppliers.router, prefix=f"{settings.API_V1_STR}/suppliers",
 app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["analytics"])
 app.include_router(ai.router, prefix=f"{settings.API_V1_STR}/ai", tags=["ai"])
 
+def _verify_token(token: str):
+    try:
+        return security.jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except security.jwt.JWTError:
+        return None # Stays anonymous: public topics only
+
 # WebSocket Endpoint
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+    # ?topics=a,b to receive only those; anonymous until the client sends
+    # {"action": "auth", "token": ...}, then limited to what the token may see
+    await manager.connect(
+        websocket,
+        client_id=client_id,
+        topics=parse_topics(websocket.query_params.get("topics")),
+    )
     try:
         while True:
             data = await websocket.receive_text()
+            # "pong" heartbeats, auth and subscribe/unsubscribe
+            manager.handle_message(websocket, data, _verify_token)
             # Echo or process
             # await manager.send_personal_message(f"You wrote: {data}", websocket)
             pass
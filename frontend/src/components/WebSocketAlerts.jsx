@@ -7,6 +7,20 @@ const WebSocketAlerts = () => {
         // In real app, get user ID or use shared channel
         const clientId = Date.now();
         const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        // Browsers can't set headers on a WebSocket, and a token in the URL ends up
+        // in access logs, so it goes in the first message once the socket is open.
+        // The server decides what we may see; the claims only pick what to ask for:
+        // every order for admins, our own orders otherwise
+        const token = localStorage.getItem('token') || '';
+        let claims = {};
+        try {
+            claims = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+        } catch {
+            // No token: stock alerts only
+        }
+        const orderTopic = claims.is_superuser ? 'orders' : (claims.id != null ? `user:${claims.id}` : null);
+        // Only the topics this component reacts to, not every event
+        const topics = [orderTopic, 'stock:low'].filter(Boolean);
         // Use window.location.hostname to support docker/remote
         const wsUrl = `${wsProtocol}//${window.location.hostname}:8000/ws/${clientId}`;
 
@@ -14,9 +28,25 @@ const WebSocketAlerts = () => {
 
         ws.onopen = () => {
             console.log('Connected to WebSocket for alerts');
+            // Messages are handled in order, so the subscribe sees the identity
+            if (token) {
+                ws.send(JSON.stringify({ action: 'auth', token }));
+            }
+            ws.send(JSON.stringify({ action: 'subscribe', topics }));
         };
 
         ws.onmessage = (event) => {
+            let message = null;
+            try {
+                message = JSON.parse(event.data);
+            } catch {
+                // Not JSON: shown as is below
+            }
+            // Server heartbeat: answer so the connection is kept
+            if (message && message.type === 'ping') {
+                ws.send('pong');
+                return;
+            }
             console.log('New Message:', event.data);
             // Simple alert for now, can be upgraded to Toast
             // alert(`Notification: ${event.data}`); 
@@ -4,7 +4,7 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContaine
 import { IndianRupee, ShoppingBag, AlertTriangle, Package } from 'lucide-react';
 
 const Dashboard = () => {
-    const [stats, setStats] = useState(null);
+    const [sections, setSections] = useState(null);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
@@ -14,10 +14,12 @@ const Dashboard = () => {
     const fetchDashboardData = async () => {
         try {
             const token = localStorage.getItem('token');
-            const response = await axios.get('/api/v1/analytics/dashboard', {
+            // One round trip for every dashboard section; a slow section comes
+            // back with status "timeout" instead of holding up the page
+            const response = await axios.get('/api/v1/dashboard/composite', {
                 headers: { Authorization: `Bearer ${token}` }
             });
-            setStats(response.data);
+            setSections(response.data.sections);
         } catch (error) {
             console.error("Dashboard Error:", error);
         } finally {
@@ -26,8 +28,28 @@ const Dashboard = () => {
     };
 
     if (loading) return <div className="p-8">Loading Dashboard...</div>;
-    if (!stats) return <div className="p-8">Failed to load dashboard data.</div>;
+    if (!sections) return <div className="p-8">Failed to load dashboard data.</div>;
 
+    const { analytics, inventory, recent_orders } = sections;
+    if (analytics.status !== 'ok') {
+        return (
+            <div className="space-y-8">
+                <h1 className="text-2xl font-bold text-gray-800">Business Overview</h1>
+                <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
+                    <div className="px-6 py-4 border-b border-gray-100">
+                        <h3 className="text-lg font-semibold text-gray-700">Sales &amp; Stock Metrics</h3>
+                    </div>
+                    <SectionUnavailable section={analytics} />
+                </div>
+                <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
+                    <RecentOrders section={recent_orders} />
+                    <LowStock section={inventory} />
+                </div>
+            </div>
+        );
+    }
+
+    const stats = analytics.data;
     const { stats: metrics, daily_revenue, order_status_distribution } = stats;
 
     // Prepare chart data
@@ -116,6 +138,84 @@ const Dashboard = () => {
                     </table>
                 </div>
             </div>
+
+            <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
+                <RecentOrders section={recent_orders} />
+                <LowStock section={inventory} />
+            </div>
+        </div>
+    );
+};
+
+const LOW_STOCK_ROWS = 5;
+
+// A section that timed out or failed upstream; the rest of the page still renders
+const SectionUnavailable = ({ section }) => (
+    <div className="px-6 py-4 text-sm text-gray-500">
+        {section.status === 'timeout' ? 'Taking too long to load, refresh to try again.' : 'Could not be loaded.'}
+    </div>
+);
+
+const RecentOrders = ({ section }) => (
+    <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
+        <div className="px-6 py-4 border-b border-gray-100">
+            <h3 className="text-lg font-semibold text-gray-700">Recent Orders</h3>
+        </div>
+        {section.status !== 'ok' ? <SectionUnavailable section={section} /> : (
+            <div className="overflow-x-auto">
+                <table className="w-full">
+                    <thead className="bg-gray-50 text-gray-500 text-sm">
+                        <tr>
+                            <th className="px-6 py-3 text-left font-medium">Order</th>
+                            <th className="px-6 py-3 text-left font-medium">Status</th>
+                            <th className="px-6 py-3 text-right font-medium">Amount</th>
+                        </tr>
+                    </thead>
+                    <tbody className="divide-y divide-gray-100">
+                        {section.data.map((order) => (
+                            <tr key={order.id} className="hover:bg-gray-50/50">
+                                <td className="px-6 py-4 text-gray-800">#{order.id}</td>
+                                <td className="px-6 py-4 text-gray-600 capitalize">{order.status}</td>
+                                <td className="px-6 py-4 text-right font-medium text-gray-600">₹{order.total_amount.toLocaleString()}</td>
+                            </tr>
+                        ))}
+                    </tbody>
+                </table>
+            </div>
+        )}
+    </div>
+);
+
+const LowStock = ({ section }) => {
+    const products = section.status === 'ok'
+        ? [...section.data].sort((a, b) => a.stock_quantity - b.stock_quantity).slice(0, LOW_STOCK_ROWS)
+        : [];
+
+    return (
+        <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
+            <div className="px-6 py-4 border-b border-gray-100">
+                <h3 className="text-lg font-semibold text-gray-700">Lowest Stock</h3>
+            </div>
+            {section.status !== 'ok' ? <SectionUnavailable section={section} /> : (
+                <div className="overflow-x-auto">
+                    <table className="w-full">
+                        <thead className="bg-gray-50 text-gray-500 text-sm">
+                            <tr>
+                                <th className="px-6 py-3 text-left font-medium">Product Name</th>
+                                <th className="px-6 py-3 text-right font-medium">In Stock</th>
+                            </tr>
+                        </thead>
+                        <tbody className="divide-y divide-gray-100">
+                            {products.map((product) => (
+                                <tr key={product.id} className="hover:bg-gray-50/50">
+                                    <td className="px-6 py-4 text-gray-800">{product.name}</td>
+                                    <td className="px-6 py-4 text-right font-medium text-gray-600">{product.stock_quantity} units</td>
+                                </tr>
+                            ))}
+                        </tbody>
+                    </table>
+                </div>
+            )}
         </div>
     );
 };
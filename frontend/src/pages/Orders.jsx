@@ -6,6 +6,7 @@ import MarkdownRenderer from '../components/MarkdownRenderer';
 
 const Orders = () => {
     const [orders, setOrders] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [createLoading, setCreateLoading] = useState(false);
 
     // Modal State
@@ -17,14 +18,16 @@ const Orders = () => {
         fetchOrders();
     }, []);
 
-    const fetchOrders = async () => {
+    // Pages come newest first; X-Next-Cursor points at the next (older) page
+    const fetchOrders = async (cursor = null) => {
         try {
             const token = localStorage.getItem('token');
             const response = await axios.get('/api/v1/orders/', {
-                headers: { Authorization: `Bearer ${token}` }
+                headers: { Authorization: `Bearer ${token}` },
+                params: cursor ? { cursor } : {}
             });
-            // Sort by ID desc
-            setOrders(response.data.sort((a, b) => b.id - a.id));
+            setOrders(prev => cursor ? [...prev, ...response.data] : response.data);
+            setNextCursor(response.headers['x-next-cursor'] || null);
         } catch (error) {
             console.error(error);
         }
@@ -175,6 +178,16 @@ const Orders = () => {
                 {orders.length === 0 && (
                     <div className="p-8 text-center text-gray-500">No orders found. Create one to get started.</div>
                 )}
+                {nextCursor && (
+                    <div className="p-4 text-center border-t border-gray-100">
+                        <button
+                            onClick={() => fetchOrders(nextCursor)}
+                            className="text-indigo-600 hover:text-indigo-800 text-sm font-medium"
+                        >
+                            Load more
+                        </button>
+                    </div>
+                )}
             </div>
 
             <Modal
@@ -0,0 +1,120 @@
+import asyncio
+import httpx
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# "p2c" (power of two choices) or "least_outstanding"
+LB_STRATEGY = os.getenv("GATEWAY_LB_STRATEGY", "p2c")
+
+# Passive health: eject a replica after consecutive failures
+EJECT_AFTER_FAILURES = int(os.getenv("GATEWAY_EJECT_AFTER_FAILURES", "3"))
+EJECT_DURATION = float(os.getenv("GATEWAY_EJECT_DURATION", "10"))
+
+# Active health: probe every replica's /health endpoint
+HEALTH_CHECK_INTERVAL = float(os.getenv("GATEWAY_HEALTH_CHECK_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("GATEWAY_HEALTH_CHECK_TIMEOUT", "2"))
+HEALTH_CHECK_PATH = os.getenv("GATEWAY_HEALTH_CHECK_PATH", "/health")
+
+
+def parse_replicas(value: str) -> list:
+    """AUTH_SERVICE etc. accept a comma separated list of replica URLs."""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.netloc = httpx.URL(url).netloc.decode("ascii")
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.healthy = True # Last active probe result
+
+    def available(self) -> bool:
+        return self.healthy and time.monotonic() >= self.ejected_until
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= EJECT_AFTER_FAILURES:
+            if time.monotonic() >= self.ejected_until:
+                logger.warning(f"Ejecting replica {self.url} for {EJECT_DURATION}s after {self.consecutive_failures} failures")
+            self.ejected_until = time.monotonic() + EJECT_DURATION
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+        }
+
+
+class Balancer:
+    def __init__(self, strategy: str = LB_STRATEGY):
+        self.strategy = strategy
+
+    def pick(self, replicas: list, exclude: tuple = ()) -> Replica:
+        candidates = [r for r in replicas if r not in exclude and r.available()]
+        if not candidates:
+            # Panic mode: everything looks unhealthy, spread load over all of
+            # them rather than failing every request at the gateway.
+            candidates = [r for r in replicas if r not in exclude] or list(replicas)
+
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "least_outstanding":
+            fewest = min(r.outstanding for r in candidates)
+            return random.choice([r for r in candidates if r.outstanding == fewest])
+        # Power of two choices: sample two, keep the less loaded one
+        a, b = random.sample(candidates, 2)
+        return a if a.outstanding <= b.outstanding else b
+
+
+class HealthChecker:
+    """Background task that actively probes every replica."""
+
+    def __init__(self, replicas: list):
+        self.replicas = replicas
+        self._task = None
+        self._client = None
+
+    def start(self):
+        self._client = httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def _probe(self, replica: Replica):
+        try:
+            resp = await self._client.get(f"{replica.url}{HEALTH_CHECK_PATH}")
+            healthy = resp.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != replica.healthy:
+            logger.info(f"Replica {replica.url} is now {'healthy' if healthy else 'unhealthy'}")
+        replica.healthy = healthy
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self._probe(r) for r in self.replicas))
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Callable
+import httpx
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from app.core import proxy, deadline
+from app.core.cache import response_cache, WRITE_METHODS
+from app.core.resilience import UpstreamUnavailable
+from app.core.ratelimit import rate_limiter, client_key
+from app.core.identity import IDENTITY_HEADER
+
+logger = logging.getLogger(__name__)
+
+# POST /api/v1/batch runs many sub-requests in one client round trip.
+BATCH_MAX_REQUESTS = int(os.getenv("GATEWAY_BATCH_MAX_REQUESTS", "50"))
+# Sub-requests of one batch in flight at the same time
+BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8"))
+# Sub-responses are decoded into the batch body, so they must fit in memory
+BATCH_MAX_RESPONSE_BYTES = int(os.getenv("GATEWAY_BATCH_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+
+# "{{create_supplier.body.id}}" is replaced by that field of an earlier result
+REFERENCE = re.compile(r"\{\{\s*([\w-]+)((?:\.[\w-]+)*)\s*\}\}")
+
+# The batch body's own framing must not leak into the sub-requests. Sub-
+# responses are decoded into JSON, so they're requested uncompressed.
+_NOT_INHERITED = {"content-length", "content-type", "transfer-encoding", "content-encoding", "accept-encoding"}
+
+
+class SubRequest(BaseModel):
+    id: str
+    method: str = "GET"
+    path: str
+    headers: dict[str, str] = {}
+    # dict/list are sent as JSON, a string is sent as-is (set Content-Type)
+    body: Any = None
+    depends_on: list[str] = []
+    # Optional cap (seconds) on this sub-request, within the batch's budget
+    timeout: float | None = None
+
+
+class BatchRequest(BaseModel):
+    requests: list[SubRequest]
+
+
+class FailedDependency(Exception):
+    pass
+
+
+def _references(value) -> set:
+    if isinstance(value, str):
+        return {m.group(1) for m in REFERENCE.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(_references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value)) if value else set()
+    return set()
+
+
+def dependencies(sub: SubRequest) -> set:
+    # Referencing another result implies depending on it
+    return set(sub.depends_on) | _references(sub.path) | _references(sub.body) | _references(sub.headers)
+
+
+def validate(batch: BatchRequest) -> dict:
+    """Check ids and dependencies, returning each sub-request's dependency set."""
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_REQUESTS} requests")
+
+    ids = [sub.id for sub in batch.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Sub-request ids must be unique")
+
+    deps = {sub.id: dependencies(sub) for sub in batch.requests}
+    for sub_id, needs in deps.items():
+        unknown = needs - set(ids)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"{sub_id} depends on unknown request(s) {sorted(unknown)}")
+
+    # Kahn's algorithm: anything left over is part of a cycle
+    remaining = {sub_id: set(needs) for sub_id, needs in deps.items()}
+    ready = [sub_id for sub_id, needs in remaining.items() if not needs]
+    while ready:
+        done = ready.pop()
+        del remaining[done]
+        for sub_id, needs in remaining.items():
+            if done in needs:
+                needs.discard(done)
+                if not needs:
+                    ready.append(sub_id)
+    cyclic = sorted(remaining)
+    if cyclic:
+        raise HTTPException(status_code=400, detail=f"Dependency cycle between {cyclic}")
+    return deps
+
+
+def _lookup(results: dict, sub_id: str, fields: str):
+    value = results[sub_id]
+    for field in filter(None, fields.split(".")):
+        try:
+            value = value[int(field)] if isinstance(value, list) else value[field]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise FailedDependency(f"{sub_id}{fields} not found in the result of {sub_id}")
+    return value
+
+
+def substitute(value, results: dict):
+    if isinstance(value, str):
+        whole = REFERENCE.fullmatch(value.strip())
+        if whole:
+            # Keep the referenced value's JSON type (ids stay integers)
+            return _lookup(results, whole.group(1), whole.group(2))
+        return REFERENCE.sub(lambda m: str(_lookup(results, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {k: substitute(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute(v, results) for v in value]
+    return value
+
+
+async def _read_limited(resp: httpx.Response, limit: int) -> bytes | None:
+    chunks, size = [], 0
+    async for chunk in resp.aiter_bytes():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _decode(resp: httpx.Response, content: bytes):
+    if "json" in resp.headers.get("content-type", ""):
+        try:
+            return json.loads(content)
+        except ValueError:
+            pass
+    return content.decode(resp.encoding or "utf-8", errors="replace")
+
+
+def _error(sub_id: str, status_code: int, detail: str) -> dict:
+    return {"id": sub_id, "status": status_code, "headers": {}, "body": {"detail": detail}}
+
+
+class BatchExecutor:
+    """
+    Runs a validated batch: every sub-request starts as soon as the ones it
+    depends on have finished, up to BATCH_CONCURRENCY at a time. A failed
+    dependency (error status or unresolvable reference) fails its
+    dependents with 424 without sending them.
+    """
+
+    def __init__(self, request: Request, resolve: Callable, path: str = "/api/v1/batch"):
+        self.request = request
+        # resolve(path) -> Upstream, or None for paths the gateway doesn't route
+        self.resolve = resolve
+        self.limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+        self.deadline = deadline.start(path, request)
+        self.results: dict = {}
+        self._done: dict = {}
+        self.inherited = [
+            (k, v) for k, v in proxy.upstream_request_headers(request) if k.lower() not in _NOT_INHERITED
+        ]
+
+    async def run(self, batch: BatchRequest) -> list:
+        deps = validate(batch)
+        self._done = {sub.id: asyncio.Event() for sub in batch.requests}
+        await asyncio.gather(*(self._run_one(sub, deps[sub.id]) for sub in batch.requests))
+        return [self.results[sub.id] for sub in batch.requests]
+
+    async def _run_one(self, sub: SubRequest, needs: set):
+        try:
+            for dep in needs:
+                await self._done[dep].wait()
+            failed = sorted(dep for dep in needs if self.results[dep]["status"] >= 400)
+            if failed:
+                self.results[sub.id] = _error(sub.id, 424, f"Dependency failed: {', '.join(failed)}")
+                return
+            async with self.limit:
+                self.results[sub.id] = await self._send(sub)
+        finally:
+            self._done[sub.id].set()
+
+    def _build(self, upstream, sub: SubRequest, path: str, query: str):
+        headers = dict(self.inherited)
+        overrides = {k.lower(): v for k, v in substitute(sub.headers, self.results).items()}
+        overrides.pop(IDENTITY_HEADER.lower(), None)
+        if "authorization" in overrides:
+            # Different credentials: the batch's verified identity doesn't apply
+            headers.pop(IDENTITY_HEADER.lower(), None)
+        headers.update(overrides)
+        body = substitute(sub.body, self.results)
+        kwargs = {}
+        if isinstance(body, (dict, list)):
+            kwargs["json"] = body
+        elif body is not None:
+            kwargs["content"] = str(body).encode()
+        return upstream.build_request(sub.method.upper(), path, headers=headers, params=query or None, **kwargs)
+
+    async def _send(self, sub: SubRequest) -> dict:
+        try:
+            path, _, query = substitute(sub.path, self.results).partition("?")
+        except FailedDependency as e:
+            return _error(sub.id, 424, str(e))
+        upstream = self.resolve(path)
+        if upstream is None:
+            return _error(sub.id, 404, f"No route for {path}")
+        # A batch must not be a way around the per-route limits
+        _, allowed, _ = await rate_limiter.check(path, client_key(self.request.scope))
+        if not allowed:
+            return _error(sub.id, 429, "Rate limit exceeded")
+
+        # Each part gets its route's budget, bounded by the batch's own
+        sub_deadline = min(self.deadline, deadline.start(path, self.request))
+        if sub.timeout is not None:
+            sub_deadline = min(sub_deadline, time.monotonic() + sub.timeout)
+        try:
+            resp = await upstream.send(self._build(upstream, sub, path, query), stream=True, deadline=sub_deadline)
+        except FailedDependency as e:
+            return _error(sub.id, 424, str(e))
+        except UpstreamUnavailable as e:
+            return _error(sub.id, 503, f"Service Unavailable: {e.upstream} {e.reason}")
+        except httpx.TimeoutException as e:
+            return _error(sub.id, 504, f"Gateway Timeout: {str(e) or 'request deadline exceeded'}")
+        except httpx.RequestError as e:
+            return _error(sub.id, 503, f"Service Unavailable: {str(e)}")
+
+        try:
+            # The budget covers the body too, not just the time to headers
+            content = await asyncio.wait_for(
+                _read_limited(resp, BATCH_MAX_RESPONSE_BYTES), timeout=max(0.0, sub_deadline - time.monotonic())
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            return _error(sub.id, 504, "Gateway Timeout: request deadline exceeded while reading the response")
+        except httpx.HTTPError as e:
+            return _error(sub.id, 502, f"Bad Gateway: {str(e)}")
+        finally:
+            await resp.aclose()
+        if content is None:
+            return _error(sub.id, 502, f"Response exceeds {BATCH_MAX_RESPONSE_BYTES} bytes, request it directly")
+
+        if sub.method.upper() in WRITE_METHODS and resp.status_code < 400:
+            response_cache.invalidate_for_write(path)
+        return {
+            "id": sub.id,
+            "status": resp.status_code,
+            # The body below is decoded, so its framing headers no longer apply
+            "headers": {k: v for k, v in proxy.client_response_headers(resp) if k.lower() not in _NOT_INHERITED - {"content-type"}},
+            "body": _decode(resp, content),
+        }
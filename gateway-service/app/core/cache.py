@@ -0,0 +1,274 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from fastapi import Request
+from starlette.responses import Response
+from app.core.proxy import encode_headers
+
+logger = logging.getLogger(__name__)
+
+# Edge response cache for GET routes (off by default)
+CACHE_ENABLED = os.getenv("GATEWAY_CACHE_ENABLED", "false").lower() == "true"
+CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+
+# Per-route TTLs in seconds, longest prefix wins: "prefix=ttl,prefix=ttl"
+CACHE_ROUTES = os.getenv(
+    "GATEWAY_CACHE_ROUTES",
+    "/api/v1/inventory/=10,/api/v1/suppliers/=30,/api/v1/analytics/dashboard=5",
+)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# A successful write under the key prefix invalidates the listed prefixes.
+# Order writes deduct stock, so they invalidate inventory and analytics too.
+INVALIDATION_RULES = {
+    "/api/v1/inventory/": ["/api/v1/inventory/", "/api/v1/analytics/"],
+    "/api/v1/suppliers/": ["/api/v1/suppliers/"],
+    "/api/v1/orders/": ["/api/v1/orders/", "/api/v1/inventory/", "/api/v1/analytics/"],
+}
+
+# Responses are always keyed on the caller's credentials, whatever upstream says
+ALWAYS_VARY = ("authorization",)
+
+
+def parse_routes(spec: str) -> dict:
+    routes = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        prefix, ttl = part.rsplit("=", 1)
+        routes[prefix.strip()] = float(ttl)
+    return routes
+
+
+def parse_cache_control(value: str | None) -> dict:
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip()] = arg.strip().strip('"') or None
+    return directives
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison, as required for If-None-Match
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+class CacheEntry:
+    def __init__(self, status_code: int, headers: list, body: bytes, etag: str, ttl: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.ttl = ttl
+        self.stored_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    def is_fresh(self) -> bool:
+        return self.age < self.ttl
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of upstream GET responses.
+    State is per gateway process; invalidation only sees writes that pass
+    through the same process.
+    """
+
+    def __init__(self, enabled: bool, routes: dict, max_bytes: int, max_entry_bytes: int):
+        self.enabled = enabled
+        self.routes = routes
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: OrderedDict = OrderedDict()
+        # Header names each resource varies on, learnt from its last response
+        self._vary: dict = {}
+        self.current_bytes = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl_for(self, path: str) -> float | None:
+        if not self.enabled:
+            return None
+        best = None
+        for prefix, ttl in self.routes.items():
+            if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.routes[best] if best is not None else None
+
+    def _primary_key(self, path: str, request: Request) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        return f"{path}?{query}"
+
+    def _secondary_key(self, names: tuple, request: Request) -> str:
+        # Credentials end up in here, so only keep a digest of the values
+        raw = "\n".join(f"{name}:{request.headers.get(name, '')}" for name in names)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def lookup(self, path: str, request: Request) -> CacheEntry | None:
+        primary = self._primary_key(path, request)
+        names = self._vary.get(primary)
+        if names is None:
+            self.misses += 1
+            return None
+
+        key = (primary, self._secondary_key(names, request))
+        entry = self._entries.get(key)
+        if entry is None or not entry.is_fresh():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, path: str, request: Request, status_code: int, headers: list, body: bytes, ttl: float) -> CacheEntry:
+        """Build an entry for the response and keep it if it is cacheable."""
+        header_map = {k.lower(): v for k, v in headers}
+        etag = header_map.get("etag") or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        response_cc = parse_cache_control(header_map.get("cache-control"))
+
+        # Upstream freshness wins over the route default when it is stricter
+        for directive in ("s-maxage", "max-age"):
+            if response_cc.get(directive) is not None:
+                try:
+                    ttl = min(ttl, float(response_cc[directive]))
+                except ValueError:
+                    pass
+                break
+
+        vary = [v.strip().lower() for v in header_map.get("vary", "").split(",") if v.strip()]
+        names = tuple(sorted(set(vary) | set(ALWAYS_VARY)))
+
+        headers = [(k, v) for k, v in headers if k.lower() not in ("etag", "vary")]
+        headers.append(("etag", etag))
+        headers.append(("vary", ", ".join(names)))
+        if "cache-control" not in header_map:
+            # Let clients keep the body but always revalidate with the ETag
+            headers.append(("cache-control", "no-cache"))
+        entry = CacheEntry(status_code, headers, body, etag, ttl)
+
+        cacheable = (
+            status_code == 200
+            and ttl > 0
+            and "*" not in vary
+            and "no-store" not in response_cc
+            and "private" not in response_cc
+            and entry.size <= self.max_entry_bytes
+        )
+        if not cacheable:
+            return entry
+
+        primary = self._primary_key(path, request)
+        if self._vary.get(primary) != names:
+            # Vary changed, previously stored variants are keyed differently
+            self._drop_primary(primary)
+            self._vary[primary] = names
+
+        key = (primary, self._secondary_key(names, request))
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+
+    def _drop_primary(self, primary: str):
+        for key in [k for k in self._entries if k[0] == primary]:
+            self._remove(key)
+
+    def invalidate(self, prefixes: list):
+        for key in [k for k in self._entries if k[0].startswith(tuple(prefixes))]:
+            self._remove(key)
+        for primary in [p for p in self._vary if p.startswith(tuple(prefixes))]:
+            del self._vary[primary]
+        self.invalidations += 1
+
+    def invalidate_for_write(self, path: str):
+        if not self.enabled:
+            return
+        for prefix, targets in INVALIDATION_RULES.items():
+            if path.startswith(prefix):
+                logger.info(f"Write to {path} invalidates cached {', '.join(targets)}")
+                self.invalidate(targets)
+
+    def respond(self, entry: CacheEntry, request: Request, cache_status: str) -> Response:
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            # 304 keeps the validator and caching headers but has no body
+            headers = [(k, v) for k, v in entry.headers if k.lower() in ("etag", "vary", "cache-control")]
+            response = Response(status_code=304)
+        else:
+            headers = list(entry.headers)
+            response = Response(content=entry.body, status_code=entry.status_code)
+        if cache_status == "HIT":
+            headers.append(("age", str(int(entry.age))))
+        headers.append(("x-cache", cache_status))
+
+        # Content-Length is recomputed by Response for the body we send
+        response.raw_headers = [h for h in response.raw_headers if h[0] == b"content-length"] + encode_headers(
+            [(k, v) for k, v in headers if k.lower() != "content-length"]
+        )
+        return response
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    enabled=CACHE_ENABLED,
+    routes=parse_routes(CACHE_ROUTES),
+    max_bytes=CACHE_MAX_BYTES,
+    max_entry_bytes=CACHE_MAX_ENTRY_BYTES,
+)
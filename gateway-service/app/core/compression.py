@@ -0,0 +1,245 @@
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError: # Optional, "br" is simply not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: # Optional, "zstd" is simply not offered without it
+    zstandard = None
+
+# Compress responses for clients that send Accept-Encoding
+COMPRESSION_ENABLED = os.getenv("GATEWAY_COMPRESSION_ENABLED", "true").lower() == "true"
+# Server preference when the client rates several encodings equally
+COMPRESSION_ENCODINGS = os.getenv("GATEWAY_COMPRESSION_ENCODINGS", "zstd,br,gzip")
+# Smaller bodies aren't worth the CPU or the framing overhead
+COMPRESSION_MIN_BYTES = int(os.getenv("GATEWAY_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GATEWAY_GZIP_LEVEL", "6"))
+# Low brotli/zstd levels: close to gzip -9 ratios at streaming speed
+BROTLI_QUALITY = int(os.getenv("GATEWAY_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("GATEWAY_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "text/",
+    "image/svg+xml",
+)
+
+
+def _available(encoding: str) -> bool:
+    if encoding == "br":
+        return brotli is not None
+    if encoding == "zstd":
+        return zstandard is not None
+    return encoding == "gzip"
+
+
+def negotiate(accept_encoding: str | None, preference: list) -> str | None:
+    """Pick the best encoding both sides support, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in preference:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Incremental compressor; flush() emits everything fed so far."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "gzip":
+            out = self._gzip.compress(data)
+            return out + self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._zstd.compress(data)
+        return out + self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+class CompressionStats:
+    def __init__(self):
+        self.compressed = 0
+        self.passthrough = 0 # Upstream already encoded the body
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.by_encoding: dict = {}
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": COMPRESSION_ENABLED,
+            "encodings": [e for e in _preference() if _available(e)],
+            "compressed": self.compressed,
+            "passthrough": self.passthrough,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            "by_encoding": dict(self.by_encoding),
+        }
+
+
+def _preference() -> list:
+    return [e.strip().lower() for e in COMPRESSION_ENCODINGS.split(",") if e.strip()]
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing responses with the client's preferred
+    encoding. Bodies are compressed chunk by chunk and flushed as they go, so
+    streamed upstream responses (e.g. the AI chat) are not held back. The
+    first COMPRESSION_MIN_BYTES are buffered to decide whether a body of
+    unknown length is worth compressing at all.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.preference = [e for e in _preference() if _available(e)]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.preference)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(send, encoding))
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str):
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.pending = [] # Body held back until the size decision is made
+        self.pending_size = 0
+        self.compressor = None
+        self.active = None # None: undecided, True: compressing, False: as-is
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.active = self._eligible(message)
+            if self.active is False:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.active is False:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.active is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more and self.pending_size < COMPRESSION_MIN_BYTES:
+                return
+            body = b"".join(self.pending)
+            self.pending = []
+            if self.pending_size < COMPRESSION_MIN_BYTES:
+                # Complete body turned out small, send it untouched
+                self.active = False
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body, "more_body": more})
+                return
+            self.active = True
+            await self._start_compressing()
+
+        compressed = self.compressor.compress(body, final=not more)
+        compression_stats.bytes_in += len(body)
+        compression_stats.bytes_out += len(compressed)
+        if compressed or not more:
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": more})
+
+    def _eligible(self, message) -> bool | None:
+        status = message["status"]
+        if status < 200 or status in (204, 206, 304):
+            return False
+        content_type = ""
+        length = None
+        for name, value in message.get("headers", []):
+            if name == b"content-encoding":
+                # Already encoded upstream: relay the bytes as they are
+                compression_stats.passthrough += 1
+                return False
+            if name == b"content-type":
+                content_type = value.decode("latin-1").lower()
+            elif name == b"content-length":
+                length = int(value)
+            elif name == b"cache-control" and b"no-transform" in value.lower():
+                return False
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        if length is not None and length < COMPRESSION_MIN_BYTES:
+            return False
+        # Size unknown (chunked) or large enough: decide on the first bytes
+        return None
+
+    async def _start_compressing(self):
+        self.compressor = _Compressor(self.encoding)
+        compression_stats.compressed += 1
+        compression_stats.by_encoding[self.encoding] = compression_stats.by_encoding.get(self.encoding, 0) + 1
+
+        headers = []
+        vary = []
+        for name, value in self.start.get("headers", []):
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary.append(value)
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The encoded bytes differ from the identity representation
+                value = b"W/" + value
+            headers.append((name, value))
+        if not any(b"accept-encoding" in v.lower() for v in vary):
+            vary.append(b"Accept-Encoding")
+        headers.append((b"vary", b", ".join(vary)))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        await self.send(dict(self.start, headers=headers))
@@ -0,0 +1,70 @@
+import os
+from fastapi import Request
+from app.core.batch import BatchExecutor, BatchRequest, SubRequest
+
+DASHBOARD_PATH = "/api/v1/dashboard/composite"
+# Per-section timeouts in seconds, "section=seconds,..."; a slow section is
+# reported as timed out instead of holding up the whole page
+DASHBOARD_TIMEOUTS = os.getenv("GATEWAY_DASHBOARD_TIMEOUTS", "analytics=3,inventory=2,recent_orders=2")
+DASHBOARD_INVENTORY_LIMIT = int(os.getenv("GATEWAY_DASHBOARD_INVENTORY_LIMIT", "100"))
+DASHBOARD_RECENT_ORDERS = int(os.getenv("GATEWAY_DASHBOARD_RECENT_ORDERS", "10"))
+
+
+def parse_timeouts(spec: str) -> dict:
+    timeouts = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, seconds = part.rsplit("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+_timeouts = parse_timeouts(DASHBOARD_TIMEOUTS)
+
+
+def sections() -> list:
+    return [
+        SubRequest(id="analytics", path="/api/v1/analytics/dashboard", timeout=_timeouts.get("analytics")),
+        SubRequest(
+            id="inventory",
+            path=f"/api/v1/inventory/?limit={DASHBOARD_INVENTORY_LIMIT}",
+            timeout=_timeouts.get("inventory"),
+        ),
+        SubRequest(
+            id="recent_orders",
+            path=f"/api/v1/orders/?limit={DASHBOARD_RECENT_ORDERS}",
+            timeout=_timeouts.get("recent_orders"),
+        ),
+    ]
+
+
+def _section(result: dict) -> dict:
+    code = result["status"]
+    if code < 400:
+        status = "ok"
+    elif code == 504:
+        status = "timeout"
+    else:
+        status = "error"
+    section = {"status": status, "code": code}
+    if status == "ok":
+        section["data"] = result["body"]
+    else:
+        section["detail"] = result["body"].get("detail") if isinstance(result["body"], dict) else result["body"]
+    return section
+
+
+async def composite(request: Request, resolve) -> dict:
+    """All dashboard sections in one round trip, fetched concurrently."""
+    results = await BatchExecutor(request, resolve, path=DASHBOARD_PATH).run(BatchRequest(requests=sections()))
+    by_id = {result["id"]: _section(result) for result in results}
+
+    recent = by_id["recent_orders"]
+    if recent["status"] == "ok" and isinstance(recent["data"], list):
+        # Older order-service builds ignore ?limit and return every order
+        recent["data"] = recent["data"][:DASHBOARD_RECENT_ORDERS]
+
+    return {
+        "complete": all(section["status"] == "ok" for section in by_id.values()),
+        "sections": by_id,
+    }
@@ -0,0 +1,53 @@
+import os
+import time
+from fastapi import Request
+
+# Remaining request budget in milliseconds. Set here from the per-route
+# budgets, honoured and re-computed by every service on every hop.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# Per-route budgets in seconds, longest prefix wins: "prefix=seconds,..."
+ROUTE_BUDGETS = os.getenv(
+    "GATEWAY_ROUTE_BUDGETS",
+    "/api/v1/auth/=10,/api/v1/inventory/=10,/api/v1/suppliers/=10,"
+    "/api/v1/orders/=20,/api/v1/analytics/=15,/api/v1/ai/=45",
+)
+DEFAULT_BUDGET = float(os.getenv("GATEWAY_DEFAULT_BUDGET", "30"))
+
+
+def parse_budgets(spec: str) -> dict:
+    budgets = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        prefix, seconds = part.rsplit("=", 1)
+        budgets[prefix.strip()] = float(seconds)
+    return budgets
+
+
+_budgets = parse_budgets(ROUTE_BUDGETS)
+
+
+def budget_for(path: str) -> float:
+    best = None
+    for prefix in _budgets:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return _budgets[best] if best is not None else DEFAULT_BUDGET
+
+
+def start(path: str, request: Request) -> float:
+    """Absolute (monotonic) deadline for a request entering the gateway."""
+    budget = budget_for(path)
+    # A caller may ask for less time than the route allows, never more
+    client_value = request.headers.get(DEADLINE_HEADER)
+    if client_value:
+        try:
+            budget = min(budget, float(client_value) / 1000)
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+
+def remaining(deadline: float) -> float:
+    return deadline - time.monotonic()
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Hedged GETs: if the first attempt has not answered by the route's observed
+# p95, a second attempt goes to another replica and the slower one is cancelled.
+HEDGE_ENABLED = os.getenv("GATEWAY_HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_ROUTES = os.getenv("GATEWAY_HEDGE_ROUTES", "/api/v1/inventory/")
+# At most this share of requests may send a second attempt
+HEDGE_MAX_PERCENT = float(os.getenv("GATEWAY_HEDGE_MAX_PERCENT", "10"))
+# Don't hedge until the route has this many latency samples
+HEDGE_MIN_SAMPLES = int(os.getenv("GATEWAY_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("GATEWAY_LATENCY_WINDOW", "500"))
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for one route."""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self._p95 = None
+        self._dirty = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self._dirty += 1
+
+    def p95(self) -> float | None:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        # Re-sorting on every request is wasteful, refresh every few samples
+        if self._p95 is None or self._dirty >= 10:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._dirty = 0
+        return self._p95
+
+
+class Hedger:
+    def __init__(self, enabled: bool, routes: list, max_percent: float):
+        self.enabled = enabled
+        self.routes = tuple(routes)
+        self.max_ratio = max_percent / 100
+        self.trackers: dict = {}
+        # Hedge budget: every request earns max_ratio of a hedge
+        self._budget = 0.0
+
+        # Metrics
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def route_for(self, path: str) -> str | None:
+        for prefix in self.routes:
+            if path.startswith(prefix):
+                return prefix
+        return None
+
+    def applies(self, path: str, request: Request, upstream) -> bool:
+        return (
+            self.enabled
+            and request.method == "GET"
+            and "content-length" not in request.headers # Bodies can't be replayed
+            and len(upstream.replicas) > 1
+            and self.route_for(path) is not None
+        )
+
+    def _take_budget(self) -> bool:
+        if self._budget >= 1:
+            self._budget -= 1
+            return True
+        return False
+
+    async def send(self, upstream, build_request, path: str, deadline: float | None):
+        """Send a GET built by build_request(), hedging it if it runs slow."""
+        tracker = self.trackers.setdefault(self.route_for(path), LatencyTracker(LATENCY_WINDOW))
+        self.requests += 1
+        self._budget = min(self._budget + self.max_ratio, 10)
+
+        async def attempt(replica):
+            started = time.monotonic()
+            try:
+                resp = await upstream.send(build_request(), stream=True, replica=replica, deadline=deadline)
+            except asyncio.CancelledError:
+                # The loser of a hedge took at least this long; leaving it out
+                # would keep only the fast answers and drag the p95 down
+                tracker.record(time.monotonic() - started)
+                raise
+            tracker.record(time.monotonic() - started)
+            return resp
+
+        first_replica = upstream.pick()
+        first = asyncio.ensure_future(attempt(first_replica))
+        delay = tracker.p95()
+        if delay is None:
+            return await first
+
+        tasks = {first}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._take_budget():
+                winner = first
+                return await first
+
+            self.hedged += 1
+            second = asyncio.ensure_future(attempt(upstream.pick(exclude=(first_replica,))))
+            tasks.add(second)
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser; if it already has a response, release it
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_ratio": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": {
+                route: round(t.p95() * 1000, 3) if t.p95() is not None else None
+                for route, t in self.trackers.items()
+            },
+        }
+
+
+hedger = Hedger(
+    enabled=HEDGE_ENABLED,
+    routes=[r.strip() for r in HEDGE_ROUTES.split(",") if r.strip()],
+    max_percent=HEDGE_MAX_PERCENT,
+)
@@ -0,0 +1,151 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+# The gateway verifies bearer tokens once and tells the services who the
+# caller is with a signed header, so they can skip their own jwt.decode.
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# HMAC key for the identity header; shared with the services, SECRET_KEY if unset
+IDENTITY_SECRET = os.getenv("INTERNAL_IDENTITY_SECRET", "") or SECRET_KEY
+IDENTITY_ENABLED = os.getenv("GATEWAY_IDENTITY_ENABLED", "true").lower() == "true" and bool(SECRET_KEY)
+IDENTITY_HEADER = "X-Verified-Identity"
+# Verified tokens are cached until they expire, bounded in number
+TOKEN_CACHE_SIZE = int(os.getenv("GATEWAY_TOKEN_CACHE_SIZE", "10000"))
+# Tokens without "exp" and rejected tokens are only remembered this long
+TOKEN_CACHE_MAX_TTL = float(os.getenv("GATEWAY_TOKEN_CACHE_MAX_TTL", "300"))
+INVALID_TOKEN_TTL = float(os.getenv("GATEWAY_INVALID_TOKEN_TTL", "30"))
+
+# Only these claims travel to the services
+FORWARDED_CLAIMS = ("sub", "id", "is_superuser", "exp")
+
+_IDENTITY_HEADER_RAW = IDENTITY_HEADER.lower().encode()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def sign_identity(claims: dict, secret: str) -> str:
+    """Compact "<claims>.<hmac>" value for the identity header."""
+    payload = _b64(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode())
+    signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()
+    return f"{payload}.{_b64(signature)}"
+
+
+class TokenVerifier:
+    def __init__(self, enabled: bool, secret: str, algorithm: str, identity_secret: str, max_entries: int):
+        self.enabled = enabled
+        self.secret = secret
+        self.algorithm = algorithm
+        self.identity_secret = identity_secret
+        self.max_entries = max_entries
+        # sha256(token) -> (expires_at, claims or None, identity header or None)
+        self._cache: OrderedDict = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def verify(self, token: str) -> tuple[dict | None, str | None]:
+        """(claims, identity header) for a valid token, (None, None) otherwise."""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            del self._cache[key]
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError:
+            self.rejected += 1
+            # Let the service produce the 401; just don't decode this one again soon
+            self._store(key, now + INVALID_TOKEN_TTL, None, None)
+            return None, None
+
+        self.verified += 1
+        forwarded = {k: claims[k] for k in FORWARDED_CLAIMS if k in claims}
+        expires_at = claims.get("exp") if isinstance(claims.get("exp"), (int, float)) else now + TOKEN_CACHE_MAX_TTL
+        if "exp" not in forwarded:
+            forwarded["exp"] = int(expires_at)
+        header = sign_identity(forwarded, self.identity_secret)
+        self._store(key, expires_at, claims, header)
+        return claims, header
+
+    def _store(self, key: bytes, expires_at: float, claims, header):
+        self._cache[key] = (expires_at, claims, header)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+
+def service_identity(ttl: float = 3600) -> str | None:
+    """Identity header for the gateway's own calls that need to see everything (the WebSocket hub)."""
+    if not IDENTITY_ENABLED:
+        return None
+    claims = {"sub": "api-gateway", "id": 0, "is_superuser": True, "exp": int(time.time() + ttl)}
+    return sign_identity(claims, IDENTITY_SECRET)
+
+
+token_verifier = TokenVerifier(IDENTITY_ENABLED, SECRET_KEY, ALGORITHM, IDENTITY_SECRET, TOKEN_CACHE_SIZE)
+
+
+class IdentityMiddleware:
+    """
+    Strips any client-supplied identity header and, for a valid bearer
+    token, adds the gateway's signed one. Every forwarding path copies the
+    request headers, so they all pass it on. Verified claims are left in
+    scope["state"]["identity"] for the gateway's own use (rate limiting,
+    WebSocket topics). Browsers can't set headers on a WebSocket; they
+    authenticate with their first message instead (see ws_hub).
+    """
+
+    def __init__(self, app, verifier: TokenVerifier = token_verifier):
+        self.app = app
+        self.verifier = verifier
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = []
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == _IDENTITY_HEADER_RAW:
+                continue # Only the gateway may assert an identity
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+            headers.append((name, value))
+
+        if self.verifier.enabled and authorization:
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() == "bearer" and token:
+                claims, identity = self.verifier.verify(token.strip())
+                if claims is not None:
+                    headers.append((_IDENTITY_HEADER_RAW, identity.encode("latin-1")))
+                    scope.setdefault("state", {})["identity"] = claims
+
+        scope["headers"] = headers
+        await self.app(scope, receive, send)
@@ -0,0 +1,143 @@
+import asyncio
+import httpx
+from fastapi import Request
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+# Headers that only apply to a single transport hop (RFC 9110 section 7.6.1)
+# and must never be relayed by a proxy.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+def _hop_by_hop(headers) -> set:
+    # Anything listed in the Connection header is hop-by-hop as well
+    names = set(HOP_BY_HOP_HEADERS)
+    for token in headers.get("connection", "").split(","):
+        if token.strip():
+            names.add(token.strip().lower())
+    return names
+
+
+def upstream_request_headers(request: Request, identity: bool = False) -> list:
+    excluded = _hop_by_hop(request.headers) | {"host"} # Let httpx set host
+    if identity:
+        # Shared/cached bodies must not depend on one client's Accept-Encoding;
+        # the gateway compresses them per client instead.
+        excluded.add("accept-encoding")
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in excluded]
+    if identity:
+        headers.append(("accept-encoding", "identity"))
+    return headers
+
+
+def upstream_request_body(request: Request):
+    # Only stream a body if the client actually sent one; GET/DELETE without
+    # a body must not turn into a chunked upload.
+    if "content-length" in request.headers or "transfer-encoding" in request.headers:
+        return request.stream()
+    return None
+
+
+def client_response_headers(resp: httpx.Response) -> list:
+    excluded = _hop_by_hop(resp.headers) | {"date", "server"} # Set by the gateway's own server
+    return [(k, v) for k, v in resp.headers.multi_items() if k.lower() not in excluded]
+
+
+def encode_headers(headers: list) -> list:
+    return [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+
+async def _iter_upstream(resp: httpx.Response):
+    try:
+        # Raw bytes: keep the upstream Content-Encoding/Content-Length intact
+        async for chunk in resp.aiter_raw():
+            yield chunk
+    finally:
+        await resp.aclose()
+
+
+def relay(resp: httpx.Response) -> StreamingResponse:
+    """Relay an upstream response opened with stream=True chunk by chunk."""
+    response = StreamingResponse(
+        _iter_upstream(resp),
+        status_code=resp.status_code,
+        background=BackgroundTask(resp.aclose),
+    )
+    # Set raw headers directly so repeated headers (e.g. Set-Cookie) survive
+    response.raw_headers = encode_headers(client_response_headers(resp))
+    return response
+
+
+def bufferable(resp: httpx.Response, limit: int) -> bool:
+    """Whether the headers promise a body small enough to read into memory."""
+    length = resp.headers.get("content-length")
+    return length is not None and length.isdigit() and int(length) <= limit
+
+
+async def read_raw(resp: httpx.Response) -> bytes:
+    """Read a streamed upstream response into memory and close it."""
+    try:
+        return b"".join([chunk async for chunk in resp.aiter_raw()])
+    finally:
+        await resp.aclose()
+
+
+class BufferedResponse:
+    """An upstream response read fully into memory, safe to share or cache."""
+
+    def __init__(self, status_code: int, headers: list, body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        # Keep the computed Content-Length, relay everything else as-is
+        response.raw_headers = [h for h in response.raw_headers if h[0] == b"content-length"] + encode_headers(
+            [(k, v) for k, v in self.headers if k.lower() != "content-length"]
+        )
+        return response
+
+
+class UnbufferedResponse:
+    """
+    An upstream response too large (or without a Content-Length) to buffer,
+    still open. Exactly one caller may claim and relay it; a response nobody
+    claims is closed after UNCLAIMED_CLOSE_AFTER so its connection goes back.
+    """
+
+    UNCLAIMED_CLOSE_AFTER = 5.0
+
+    def __init__(self, resp: httpx.Response):
+        self._resp = resp
+        asyncio.get_running_loop().call_later(self.UNCLAIMED_CLOSE_AFTER, self._close_unclaimed)
+
+    def claim(self) -> httpx.Response | None:
+        resp, self._resp = self._resp, None
+        return resp
+
+    def _close_unclaimed(self):
+        resp = self.claim()
+        if resp is not None:
+            asyncio.ensure_future(resp.aclose())
+
+
+async def buffer(resp: httpx.Response, limit: int) -> BufferedResponse | UnbufferedResponse:
+    """
+    Buffer a streamed upstream response so it can be shared or cached,
+    deciding from its headers alone. Anything else comes back still open as
+    an UnbufferedResponse, to be relayed as it is rather than fetched again.
+    """
+    if not bufferable(resp, limit):
+        return UnbufferedResponse(resp)
+    body = await read_raw(resp)
+    return BufferedResponse(resp.status_code, client_response_headers(resp), body)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Token buckets per route group, "prefix=rate:burst,..." where rate is tokens
+# per second and burst the bucket size. Longest prefix wins; "default" covers
+# every other /api/ path.
+RATE_LIMIT_ENABLED = os.getenv("GATEWAY_RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMITS = os.getenv(
+    "GATEWAY_RATE_LIMITS",
+    "/api/v1/auth/=2:10,/api/v1/orders/=10:30,/api/v1/ai/=1:5,default=50:100",
+)
+# "memory" (per process) or "sqlite:///path/to/file" to share the buckets
+# between gateway workers on the same host
+RATE_LIMIT_STORE = os.getenv("GATEWAY_RATE_LIMIT_STORE", "memory")
+# How long the sqlite store waits on another worker's lock before letting the
+# request through; keep it far below the route budgets
+RATE_LIMIT_BUSY_TIMEOUT_MS = int(os.getenv("GATEWAY_RATE_LIMIT_BUSY_TIMEOUT_MS", "20"))
+# Bound on tracked keys for the memory store; least recently seen go first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("GATEWAY_RATE_LIMIT_MAX_KEYS", "100000"))
+# Only behind a trusted proxy: take the client IP from X-Forwarded-For
+TRUST_FORWARDED_FOR = os.getenv("GATEWAY_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+
+class Limit:
+    def __init__(self, group: str, rate: float, burst: float):
+        self.group = group
+        self.rate = rate
+        self.burst = burst
+
+    def policy(self) -> str:
+        return f"{int(self.burst)};w={math.ceil(self.burst / self.rate)}"
+
+
+def parse_limits(spec: str) -> dict:
+    limits = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        group, value = part.rsplit("=", 1)
+        rate, _, burst = value.partition(":")
+        rate = float(rate)
+        limits[group.strip()] = Limit(group.strip(), rate, float(burst) if burst else rate)
+    return limits
+
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(limit.burst, tokens + max(0.0, now - updated) * limit.rate)
+
+
+class MemoryStore:
+    """Buckets in this process only: each worker enforces its own budget."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+
+    async def take(self, key: str, limit: Limit, cost: float = 1) -> tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (limit.burst, now))
+        tokens = _refill(tokens, updated, now, limit)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # A forgotten key just starts again with a full bucket
+            self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteStore:
+    """
+    Buckets in a local SQLite file so every gateway worker on the host draws
+    from the same budget. Each take is one short IMMEDIATE transaction, run
+    on a dedicated thread so waiting for the file lock never blocks the loop.
+    """
+
+    # Rows idle this long are dropped (their bucket would be full anyway)
+    PRUNE_EVERY = 10000
+    IDLE_SECONDS = 3600
+
+    def __init__(self, path: str, busy_timeout_ms: int):
+        self.path = path
+        self.busy_timeout = busy_timeout_ms / 1000
+        self._takes = 0
+        # One thread owns the connection, so takes never interleave on it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit")
+        self._db = sqlite3.connect(path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF") # Losing a few refills on a crash is fine
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    async def take(self, key: str, limit: Limit, cost: float = 1) -> tuple[bool, float]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._take, key, limit, cost)
+
+    def _take(self, key: str, limit: Limit, cost: float) -> tuple[bool, float]:
+        now = time.time() # Wall clock: shared between processes
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, limit) if row else limit.burst
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._db.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._db.execute("COMMIT")
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                self.prune(self.IDLE_SECONDS)
+            return allowed, tokens
+        except sqlite3.Error as e:
+            # Fail open: a busy or broken store must not take the API down
+            logger.warning(f"Rate limit store error, allowing request: {e}")
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            return True, limit.burst
+
+    def prune(self, older_than: float):
+        self._db.execute("DELETE FROM rate_buckets WHERE updated < ?", (time.time() - older_than,))
+
+    def __len__(self):
+        # Own connection: the executor thread may be mid-transaction on ours
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        try:
+            return db.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+        except sqlite3.Error:
+            return -1
+        finally:
+            db.close()
+
+
+def make_store(spec: str):
+    if spec.startswith("sqlite:///"):
+        return SQLiteStore(spec[len("sqlite:///"):], RATE_LIMIT_BUSY_TIMEOUT_MS)
+    return MemoryStore(RATE_LIMIT_MAX_KEYS)
+
+
+def client_key(scope) -> str:
+    headers = dict(scope["headers"])
+    # Only claims IdentityMiddleware has verified: an unchecked token would let
+    # a client pick its own bucket, or drain someone else's
+    identity = scope.get("state", {}).get("identity")
+    if identity is not None and identity.get("sub") is not None:
+        return f"user:{identity['sub']}"
+    if TRUST_FORWARDED_FOR and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimiter:
+    def __init__(self, enabled: bool, limits: dict, store):
+        self.enabled = enabled
+        self.limits = limits
+        self.store = store
+
+        # Metrics
+        self.allowed = 0
+        self.limited: dict = {}
+
+    def limit_for(self, path: str) -> Limit | None:
+        best = None
+        for prefix in self.limits:
+            if prefix != "default" and path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        if best is not None:
+            return self.limits[best]
+        return self.limits.get("default") if path.startswith("/api/") else None
+
+    async def check(self, path: str, key: str) -> tuple[Limit | None, bool, float]:
+        """Take a token for key on path's group: (limit, allowed, tokens left)."""
+        limit = self.limit_for(path) if self.enabled else None
+        if limit is None:
+            return None, True, 0.0
+        allowed, tokens = await self.store.take(f"{limit.group}|{key}", limit)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited[limit.group] = self.limited.get(limit.group, 0) + 1
+        return limit, allowed, tokens
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "store": type(self.store).__name__,
+            "keys": len(self.store),
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+        }
+
+
+def rate_limit_headers(limit: Limit, tokens: float) -> list:
+    # draft-ietf-httpapi-ratelimit-headers: Reset is the time to a full bucket
+    reset = math.ceil((limit.burst - tokens) / limit.rate)
+    return [
+        ("RateLimit-Limit", str(int(limit.burst))),
+        ("RateLimit-Remaining", str(int(tokens))),
+        ("RateLimit-Reset", str(reset)),
+        ("RateLimit-Policy", limit.policy()),
+    ]
+
+
+def retry_after(limit: Limit, tokens: float) -> int:
+    return max(1, math.ceil((1 - tokens) / limit.rate))
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_ENABLED, parse_limits(RATE_LIMITS), make_store(RATE_LIMIT_STORE))
+
+
+class RateLimitMiddleware:
+    """Admission control at the edge: 429 before any upstream is touched."""
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit, allowed, tokens = await self.limiter.check(scope["path"], client_key(scope))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = rate_limit_headers(limit, tokens)
+        if not allowed:
+            headers.append(("Retry-After", str(retry_after(limit, tokens))))
+            response = JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"}, headers=dict(headers))
+            await response(scope, receive, send)
+            return
+
+        encoded = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + encoded)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
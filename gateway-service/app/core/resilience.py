@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker (per upstream)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GATEWAY_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("GATEWAY_BREAKER_RESET_TIMEOUT", "30"))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("GATEWAY_BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+# Concurrency budgets (per upstream). Reads and writes are limited separately
+# so a flood of dashboard reads cannot starve order creation.
+READ_CONCURRENCY = int(os.getenv("GATEWAY_READ_CONCURRENCY", "64"))
+WRITE_CONCURRENCY = int(os.getenv("GATEWAY_WRITE_CONCURRENCY", "32"))
+# How long a request may queue for a slot before it is shed with a 503
+QUEUE_TIMEOUT = float(os.getenv("GATEWAY_QUEUE_TIMEOUT", "0.5"))
+# Retry-After sent when a request is shed because of saturation
+SHED_RETRY_AFTER = int(os.getenv("GATEWAY_SHED_RETRY_AFTER", "1"))
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream that is open-circuited or saturated."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: int):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{upstream} {reason}")
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Raise UpstreamUnavailable if the call must not go out."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise UpstreamUnavailable(self.name, "circuit open", self.retry_after())
+            self.state = self.HALF_OPEN
+            self.half_open_calls = 0
+            logger.info(f"Circuit for {self.name} half-open, probing")
+
+        if self.state == self.HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                raise UpstreamUnavailable(self.name, "circuit half-open", self.retry_after())
+            self.half_open_calls += 1
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_cancelled(self):
+        # A probe that never completed should not block the next one
+        if self.state == self.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        if self.state != self.OPEN:
+            return SHED_RETRY_AFTER
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        return max(1, math.ceil(remaining))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class Bulkhead:
+    """Bounded concurrency with a bounded wait for a free slot."""
+
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+
+        # Metrics
+        self.in_use = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self, max_wait: float | None = None):
+        timeout = self.queue_timeout if max_wait is None else max(0.0, min(self.queue_timeout, max_wait))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise UpstreamUnavailable(self.name, "saturated", SHED_RETRY_AFTER)
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class UpstreamGuard:
+    """Circuit breaker plus separate read/write concurrency budgets for one upstream."""
+
+    def __init__(self, name: str):
+        self.breaker = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, BREAKER_HALF_OPEN_MAX_CALLS)
+        self.reads = Bulkhead(name, READ_CONCURRENCY, QUEUE_TIMEOUT)
+        self.writes = Bulkhead(name, WRITE_CONCURRENCY, QUEUE_TIMEOUT)
+
+    def bulkhead_for(self, method: str) -> Bulkhead:
+        return self.reads if method in READ_METHODS else self.writes
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "reads": self.reads.stats(),
+            "writes": self.writes.stats(),
+        }
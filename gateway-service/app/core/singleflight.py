@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import os
+import time
+from fastapi import Request
+
+# Coalesce identical in-flight GETs under these prefixes (comma separated)
+COALESCE_ENABLED = os.getenv("GATEWAY_COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_ROUTES = os.getenv("GATEWAY_COALESCE_ROUTES", "/api/v1/analytics/,/api/v1/inventory/")
+# Shared responses are buffered; anything larger (or unsized) is relayed to one caller
+COALESCE_MAX_BYTES = int(os.getenv("GATEWAY_COALESCE_MAX_BYTES", str(1024 * 1024)))
+# A key whose response turned out too large to share is not coalesced for this long
+COALESCE_SKIP_SECONDS = float(os.getenv("GATEWAY_COALESCE_SKIP_SECONDS", "30"))
+COALESCE_SKIP_MAX_KEYS = 10000
+
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+
+def request_key(path: str, request: Request) -> str:
+    # Requests only share a response when they carry the same credentials;
+    # the token itself is hashed so it never sits in memory as a dict key.
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    scope = hashlib.sha256(request.headers.get("authorization", "").encode()).hexdigest()
+    return f"{request.method} {path}?{query} {scope}"
+
+
+class SingleFlight:
+    """
+    Runs one upstream call per key and fans its result out to every caller
+    that asks for the same key while it is in flight.
+    """
+
+    def __init__(self, enabled: bool, routes: list, skip_seconds: float):
+        self.enabled = enabled
+        self.routes = tuple(routes)
+        self.skip_seconds = skip_seconds
+        self._calls: dict = {}
+        self._skip: dict = {} # key -> until when callers go straight upstream
+
+        # Metrics
+        self.leaders = 0
+        self.followers = 0
+
+    def applies(self, path: str, request: Request) -> bool:
+        return self.enabled and request.method in IDEMPOTENT_METHODS and path.startswith(self.routes)
+
+    def skipped(self, key: str) -> bool:
+        until = self._skip.get(key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        del self._skip[key]
+        return False
+
+    def skip(self, key: str):
+        """Stop coalescing key for a while: its response can't be shared anyway."""
+        now = time.monotonic()
+        if len(self._skip) >= COALESCE_SKIP_MAX_KEYS:
+            self._skip = {k: until for k, until in self._skip.items() if until > now}
+            if len(self._skip) >= COALESCE_SKIP_MAX_KEYS:
+                self._skip.clear()
+        self._skip[key] = now + self.skip_seconds
+
+    async def do(self, key: str, fn):
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            # Run as its own task so a caller disconnecting does not cancel
+            # the shared upstream call for everyone else.
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "skipped_keys": len(self._skip),
+            "upstream_calls": self.leaders,
+            "coalesced": self.followers,
+            "coalescing_ratio": round(self.followers / total, 3) if total else 0.0,
+        }
+
+
+single_flight = SingleFlight(
+    enabled=COALESCE_ENABLED,
+    routes=[r.strip() for r in COALESCE_ROUTES.split(",") if r.strip()],
+    skip_seconds=COALESCE_SKIP_SECONDS,
+)
@@ -0,0 +1,240 @@
+import httpx
+import logging
+import os
+import time
+from app.core.balancer import Balancer, HealthChecker, Replica, parse_replicas
+from app.core.deadline import DEADLINE_HEADER, remaining as deadline_remaining
+from app.core.resilience import UpstreamGuard
+
+logger = logging.getLogger(__name__)
+
+# Connection pool tuning (applied per upstream service)
+POOL_MAX_CONNECTIONS = int(os.getenv("GATEWAY_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("GATEWAY_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_POOL_KEEPALIVE_EXPIRY", "30"))
+# How long a request may wait for a free pooled connection before failing
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("GATEWAY_POOL_ACQUIRE_TIMEOUT", "5"))
+
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_CONNECT_TIMEOUT", "5"))
+# Upper bound only; each request is further capped by its route budget (see deadline.py)
+UPSTREAM_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", "60"))
+
+# HTTP/2 is only negotiated over TLS (ALPN). Plain http:// upstreams keep
+# using HTTP/1.1 keep-alive even when this is switched on.
+HTTP2_ENABLED = os.getenv("GATEWAY_HTTP2", "false").lower() == "true"
+
+# httpcore trace events that mark the moment a pooled connection was handed out
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._on_close()
+        await self._stream.aclose()
+
+
+class Upstream:
+    """One long-lived, pooled client per upstream service, spread over its replicas."""
+
+    def __init__(self, name: str, urls: list):
+        self.name = name
+        self.replicas = [Replica(url) for url in urls]
+        self.balancer = Balancer()
+        self.health = HealthChecker(self.replicas)
+        self.client: httpx.AsyncClient | None = None
+        self.guard = UpstreamGuard(name)
+
+        # Metrics
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+
+    def open(self):
+        limits = httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            UPSTREAM_TIMEOUT,
+            connect=UPSTREAM_CONNECT_TIMEOUT,
+            pool=POOL_ACQUIRE_TIMEOUT,
+        )
+        self.client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=HTTP2_ENABLED)
+        self.health.start()
+
+    async def close(self):
+        await self.health.stop()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def build_request(self, method: str, path: str, **kwargs) -> httpx.Request:
+        # Built against the first replica; send() retargets it to the one it picks
+        return self.client.build_request(method, f"{self.replicas[0].url}{path}", **kwargs)
+
+    def pick(self, exclude: tuple = ()) -> Replica:
+        return self.balancer.pick(self.replicas, exclude)
+
+    def _retarget(self, request: httpx.Request, replica: Replica):
+        target = httpx.URL(replica.url)
+        request.url = request.url.copy_with(scheme=target.scheme, host=target.host, port=target.port)
+        request.headers["Host"] = replica.netloc
+
+    def _apply_deadline(self, request: httpx.Request, deadline: float):
+        # Whatever is left of the route budget caps every timeout and is
+        # passed on so the upstream can give up when we do.
+        budget = deadline_remaining(deadline)
+        if budget <= 0:
+            raise httpx.TimeoutException("Request deadline exceeded", request=request)
+        request.headers[DEADLINE_HEADER] = str(int(budget * 1000))
+        request.extensions["timeout"] = httpx.Timeout(
+            min(UPSTREAM_TIMEOUT, budget),
+            connect=min(UPSTREAM_CONNECT_TIMEOUT, budget),
+            pool=min(POOL_ACQUIRE_TIMEOUT, budget),
+        ).as_dict()
+
+    async def send(
+        self,
+        request: httpx.Request,
+        stream: bool = False,
+        replica: Replica | None = None,
+        deadline: float | None = None,
+    ) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: dict):
+            nonlocal acquired
+            if event_name == "connection.connect_tcp.started":
+                self.connections_opened += 1
+            if not acquired and event_name in _CONNECTION_ACQUIRED_EVENTS:
+                acquired = True
+                waited = time.perf_counter() - started
+                self.pool_wait_total += waited
+                self.pool_wait_max = max(self.pool_wait_max, waited)
+
+        request.extensions["trace"] = trace
+
+        # Shed load before touching the network: raises UpstreamUnavailable
+        # when the read/write budget is exhausted or the circuit is open.
+        bulkhead = self.guard.bulkhead_for(request.method)
+        await bulkhead.acquire(max_wait=deadline_remaining(deadline) if deadline is not None else None)
+        try:
+            # The bulkhead wait may have used up the budget; check that before
+            # taking a half-open probe slot, which only a recorded outcome gives back
+            if deadline is not None:
+                self._apply_deadline(request, deadline)
+            self.guard.breaker.before_call()
+        except Exception:
+            bulkhead.release()
+            raise
+
+        if replica is None:
+            replica = self.pick()
+
+        self.requests += 1
+        self.in_flight += 1
+        tried = []
+        while True:
+            self._retarget(request, replica)
+            replica.requests += 1
+            replica.outstanding += 1
+            try:
+                resp = await self.client.send(request, stream=stream)
+                break
+            except httpx.ConnectError:
+                replica.outstanding -= 1
+                replica.record_failure()
+                tried.append(replica)
+                # Nothing reached the replica yet, so any method may move on
+                # to another one.
+                if len(tried) < len(self.replicas):
+                    replica = self.pick(exclude=tuple(tried))
+                    continue
+                self.in_flight -= 1
+                bulkhead.release()
+                self.errors += 1
+                self.guard.breaker.record_failure()
+                raise
+            except BaseException as e:
+                self._release(bulkhead, replica)
+                if isinstance(e, httpx.RequestError):
+                    self.errors += 1
+                    self.guard.breaker.record_failure()
+                    replica.record_failure()
+                else:
+                    self.guard.breaker.record_cancelled()
+                raise
+
+        if resp.status_code >= 500:
+            self.guard.breaker.record_failure()
+            replica.record_failure()
+        else:
+            self.guard.breaker.record_success()
+            replica.record_success()
+
+        if stream:
+            # A streamed response keeps its connection busy until it is closed
+            resp.stream = _TrackedStream(resp.stream, lambda: self._release(bulkhead, replica))
+        else:
+            self._release(bulkhead, replica)
+        return resp
+
+    def _release(self, bulkhead, replica: Replica):
+        self.in_flight -= 1
+        replica.outstanding -= 1
+        bulkhead.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_connections": POOL_MAX_CONNECTIONS,
+            "pool_occupancy": round(self.in_flight / POOL_MAX_CONNECTIONS, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_opened": self.connections_opened,
+            "avg_pool_wait_ms": round(self.pool_wait_total / self.requests * 1000, 3) if self.requests else 0.0,
+            "max_pool_wait_ms": round(self.pool_wait_max * 1000, 3),
+            "replicas": [r.stats() for r in self.replicas],
+            **self.guard.stats(),
+        }
+
+
+class UpstreamPool:
+    def __init__(self, services: dict):
+        self.upstreams = {name: Upstream(name, parse_replicas(urls)) for name, urls in services.items()}
+
+    def get(self, name: str) -> Upstream:
+        return self.upstreams[name]
+
+    async def startup(self):
+        for upstream in self.upstreams.values():
+            upstream.open()
+        logger.info(f"Opened pooled clients for upstreams: {', '.join(self.upstreams)}")
+
+    async def shutdown(self):
+        for upstream in self.upstreams.values():
+            await upstream.close()
+        logger.info("Closed upstream clients")
+
+    def stats(self) -> dict:
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import logging
+import os
+import websockets
+from fastapi import WebSocket, WebSocketDisconnect
+from app.core.identity import IDENTITY_HEADER, service_identity, token_verifier
+
+logger = logging.getLogger(__name__)
+
+# The gateway holds one subscription to the order-service event stream and
+# fans every message out to its own clients, so the number of viewers never
+# reaches the order-service.
+WS_UPSTREAM_PATH = os.getenv("GATEWAY_WS_UPSTREAM_PATH", "/api/v1/orders/ws/0")
+# Messages buffered per client before it counts as a slow consumer
+WS_CLIENT_QUEUE_SIZE = int(os.getenv("GATEWAY_WS_CLIENT_QUEUE_SIZE", "100"))
+# "drop": discard the client's oldest queued message; "disconnect": close it
+WS_SLOW_CONSUMER_POLICY = os.getenv("GATEWAY_WS_SLOW_CONSUMER_POLICY", "drop")
+# A client that drops this many messages in a row is disconnected anyway
+WS_MAX_DROPPED = int(os.getenv("GATEWAY_WS_MAX_DROPPED", "1000"))
+WS_SEND_TIMEOUT = float(os.getenv("GATEWAY_WS_SEND_TIMEOUT", "5"))
+WS_RECONNECT_MAX_DELAY = float(os.getenv("GATEWAY_WS_RECONNECT_MAX_DELAY", "30"))
+
+# Heartbeat order-service sends to each of its connections (see its websocket_manager)
+PING_TYPE = "ping"
+
+# 1013 "Try Again Later": the client could not keep up with the stream
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+# order-service tags published messages with their "topics"; a client gets a
+# message when it subscribed to one of them. Clients pick topics with
+# ?topics=a,b or {"action": "subscribe"|"unsubscribe", "topics": [...]}; the
+# reply lists refused topics under "denied" and those past WS_MAX_TOPICS under
+# "rejected". The hub itself subscribes to everything, so it applies
+# order-service's access rules per client: stock topics are public,
+# "user:<id>" is that user's own, and the all-customer feeds ("orders",
+# "order:<id>", "dashboard", "*") need a superuser token. Browsers can't set
+# headers on a WebSocket, so they send the token as their first message,
+# {"action": "auth", "token": ...}, rather than in the URL where it would end
+# up in access logs.
+ALL_TOPICS = "*"
+WS_MAX_TOPICS = int(os.getenv("GATEWAY_WS_MAX_TOPICS", "50"))
+PUBLIC_TOPIC_PREFIXES = ("stock:", "product:")
+
+
+def topic_allowed(topic: str, identity: dict | None) -> bool:
+    if topic.startswith(PUBLIC_TOPIC_PREFIXES):
+        return True
+    if not identity:
+        return False
+    if identity.get("is_superuser"):
+        return True
+    return identity.get("id") is not None and topic == f"user:{identity['id']}"
+
+
+def default_topics(identity: dict | None) -> list:
+    if identity and identity.get("is_superuser"):
+        return [ALL_TOPICS]
+    if identity and identity.get("id") is not None:
+        return [f"user:{identity['id']}", "stock:low"]
+    return ["stock:low"]
+
+
+def is_ping(message) -> bool:
+    if not isinstance(message, str) or PING_TYPE not in message:
+        return False # Cheap check first, most messages are events
+    try:
+        parsed = json.loads(message)
+    except ValueError:
+        return False
+    return isinstance(parsed, dict) and parsed.get("type") == PING_TYPE
+
+
+class HubClient:
+    def __init__(self, websocket: WebSocket, client_id: str, identity: dict | None = None):
+        self.websocket = websocket
+        self.client_id = client_id # A label for logs, not an identity
+        self.identity = identity # Verified claims, None if anonymous
+        self.topics: set = set()
+        self.default_topics = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+        self.closing = False
+
+
+class WebSocketHub:
+    """
+    Keeps a single upstream WebSocket subscription open while anyone is
+    listening and copies each message into every client's bounded queue.
+    A per-client writer drains the queue, so one stalled browser never holds
+    up the others.
+    """
+
+    def __init__(self, urls: list):
+        self.urls = urls
+        self.clients: set = set()
+        self.topics: dict = {} # topic -> set of HubClient
+        self._task = None
+        self.connected = False
+
+        # Metrics
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.upstream_connects = 0
+
+    def _ensure_subscribed(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._subscribe())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _subscribe(self):
+        attempt = 0
+        while self.clients:
+            # Rotate through the replicas on every reconnect
+            url = self.urls[attempt % len(self.urls)] + WS_UPSTREAM_PATH
+            try:
+                # As a superuser, so order-service lets the hub see every topic
+                identity = service_identity()
+                headers = {IDENTITY_HEADER: identity} if identity else None
+                async with websockets.connect(url, additional_headers=headers) as upstream:
+                    self.connected = True
+                    self.upstream_connects += 1
+                    attempt = 0
+                    logger.info(f"WebSocket hub subscribed to {url}")
+                    async for message in upstream:
+                        if is_ping(message):
+                            # order-service's liveness check is for us, not the viewers
+                            await upstream.send("pong")
+                            continue
+                        self.publish(message)
+                        if not self.clients:
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket hub lost upstream {url}: {e}")
+            finally:
+                self.connected = False
+
+            if not self.clients:
+                break
+            attempt += 1
+            await asyncio.sleep(min(WS_RECONNECT_MAX_DELAY, 0.5 * 2 ** min(attempt, 6)))
+
+    def _recipients(self, message) -> set:
+        everyone = self.topics.get(ALL_TOPICS, set())
+        if len(everyone) == len(self.clients):
+            return set(self.clients) # Nobody filters, skip parsing
+        try:
+            topics = json.loads(message).get("topics") if isinstance(message, str) and message.startswith("{") else None
+        except ValueError:
+            topics = None
+        if not isinstance(topics, list):
+            return set(self.clients) # Untagged: a broadcast
+        recipients = set(everyone)
+        for topic in topics:
+            recipients.update(self.topics.get(topic, ()))
+        return recipients
+
+    def subscribe(self, client: HubClient, topics: list) -> tuple:
+        """
+        Subscribe to what the client may see. Returns (denied, rejected): the
+        topics it may not see, and those over WS_MAX_TOPICS.
+        """
+        if client.default_topics:
+            client.default_topics = False
+            self.unsubscribe(client, list(client.topics))
+        denied, rejected = [], []
+        for topic in topics:
+            if not topic_allowed(topic, client.identity):
+                denied.append(topic)
+                continue
+            if topic not in client.topics and len(client.topics) >= WS_MAX_TOPICS:
+                rejected.append(topic)
+                continue
+            client.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(client)
+        return denied, rejected
+
+    def _confirm(self, client: HubClient, denied=(), rejected=()):
+        message = json.dumps({
+            "type": "subscriptions",
+            "topics": sorted(client.topics),
+            "denied": list(denied),
+            "rejected": list(rejected),
+        })
+        try:
+            client.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def authenticate(self, client: HubClient, token) -> bool:
+        """Take the identity from an "auth" message; a client can't change it once set."""
+        if client.identity is None and isinstance(token, str) and token and token_verifier.enabled:
+            claims, _ = token_verifier.verify(token)
+            if claims is not None:
+                client.identity = claims
+                if client.default_topics:
+                    # Swap the anonymous defaults for this identity's
+                    self.subscribe(client, default_topics(claims))
+                    client.default_topics = True
+        message = json.dumps(
+            {"type": "auth", "authenticated": client.identity is not None, "topics": sorted(client.topics)}
+        )
+        try:
+            client.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+        return client.identity is not None
+
+    def unsubscribe(self, client: HubClient, topics: list):
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def publish(self, message):
+        self.received += 1
+        for client in self._recipients(message):
+            if client.closing:
+                continue
+            try:
+                client.queue.put_nowait(message)
+                client.dropped = 0
+                continue
+            except asyncio.QueueFull:
+                pass
+
+            if WS_SLOW_CONSUMER_POLICY == "disconnect" or client.dropped >= WS_MAX_DROPPED:
+                self._kick(client)
+                continue
+            # Newest data is the most useful to a dashboard, lose the oldest
+            client.queue.get_nowait()
+            client.queue.put_nowait(message)
+            client.dropped += 1
+            self.dropped += 1
+
+    def _kick(self, client: HubClient):
+        client.closing = True
+        self.slow_disconnects += 1
+        # Wake the writer so it can close the socket
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+
+    async def _writer(self, client: HubClient):
+        while True:
+            message = await client.queue.get()
+            if message is None:
+                logger.info(f"Disconnecting slow WebSocket client {client.client_id}")
+                await client.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            send = client.websocket.send_text if isinstance(message, str) else client.websocket.send_bytes
+            try:
+                await asyncio.wait_for(send(message), timeout=WS_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.slow_disconnects += 1
+                logger.info(f"Disconnecting WebSocket client {client.client_id}: send timed out")
+                return
+            self.delivered += 1
+
+    async def _reader(self, client: HubClient):
+        # Subscriptions are handled here; nothing goes upstream
+        while True:
+            message = await client.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            text = message.get("text") or ""
+            if not text.startswith("{"):
+                continue
+            try:
+                command = json.loads(text)
+                action = command["action"]
+                if action == "auth":
+                    self.authenticate(client, command["token"])
+                    continue
+                topics = [str(topic) for topic in command["topics"]]
+            except (ValueError, TypeError, KeyError):
+                continue
+            if action == "subscribe":
+                self._confirm(client, *self.subscribe(client, topics))
+            elif action == "unsubscribe":
+                self.unsubscribe(client, topics)
+                self._confirm(client)
+
+    async def serve(self, websocket: WebSocket, client_id: str):
+        await websocket.accept()
+        client = HubClient(websocket, client_id, websocket.scope.get("state", {}).get("identity"))
+        topics = [t.strip() for t in websocket.query_params.get("topics", "").split(",") if t.strip()]
+        denied, rejected = self.subscribe(client, topics or default_topics(client.identity))
+        client.default_topics = not topics
+        if denied or rejected:
+            self._confirm(client, denied, rejected)
+        self.clients.add(client)
+        self._ensure_subscribed()
+
+        tasks = [asyncio.create_task(self._writer(client)), asyncio.create_task(self._reader(client))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.clients.discard(client)
+            self.unsubscribe(client, list(client.topics))
+            if not self.clients:
+                # Last viewer left, release the upstream subscription
+                await self.stop()
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    await task
+                except (asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                    pass
+                except Exception as e:
+                    logger.debug(f"WebSocket client {client_id} closed with {e}")
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "topics": len(self.topics),
+            "upstream_connected": self.connected,
+            "upstream_connects": self.upstream_connects,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "queued": sum(c.queue.qsize() for c in self.clients),
+        }
@@ -1,13 +1,33 @@
 import httpx
 from fastapi import FastAPI, Request, HTTPException, WebSocket
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse
 import os
-import websockets
-import asyncio
+from app.core.upstream import UpstreamPool
+from app.core.balancer import parse_replicas
+from app.core.resilience import UpstreamUnavailable
+from app.core import proxy, deadline
+from app.core.cache import response_cache, parse_cache_control, WRITE_METHODS
+from app.core.singleflight import single_flight, request_key, COALESCE_MAX_BYTES
+from app.core.hedging import hedger
+from app.core.ws_hub import WebSocketHub
+from app.core.batch import BatchExecutor, BatchRequest
+from app.core import dashboard
+from app.core.compression import CompressionMiddleware, compression_stats
+from app.core.ratelimit import RateLimitMiddleware, rate_limiter
+from app.core.identity import IdentityMiddleware, token_verifier
 
 app = FastAPI(title="API Gateway")
 
+# gzip/br/zstd negotiated per client; upstream-encoded bodies pass through
+app.add_middleware(CompressionMiddleware)
+# Runs before the proxying: over-budget clients are turned away up front
+app.add_middleware(RateLimitMiddleware)
+# Outermost: verify the bearer token once (cached until exp) and forward a
+# signed identity header; rate limiting keys on the verified subject
+app.add_middleware(IdentityMiddleware)
+
 # Service URLs (Environment Variables with defaults for Docker)
+# Each may be a comma separated list of replicas, e.g. "http://inv-1:8000,http://inv-2:8000"
 AUTH_SERVICE = os.getenv("AUTH_SERVICE", "http://auth-service:8000")
 INVENTORY_SERVICE = os.getenv("INVENTORY_SERVICE", "http://inventory-service:8000")
 ORDER_SERVICE = os.getenv("ORDER_SERVICE", "http://order-service:8000")
@@ -17,90 +37,207 @@ AI_SERVICE = os.getenv("AI_SERVICE", "http://ai-service:8000")
 # WebSocket Target (Assuming Order Service handles real-time alerts for now)
 # If not, we might need a dedicated Notification Service. 
 # For now, let's point to Order Service as it generates order events.
-WEBSOCKET_SERVICE = ORDER_SERVICE.replace("http", "ws") 
-
-async def forward_request(service_url: str, path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        try:
-            url = f"{service_url}{path}"
-            headers = dict(request.headers)
-            headers.pop("host", None) # Let httpx set host
-            headers.pop("content-length", None)
-            
-            # Simple body forwarding
-            body = await request.body()
-            
-            resp = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                data=body, 
-                params=request.query_params,
-                timeout=60.0
-            )
-            
-            return Response(
-                content=resp.content,
-                status_code=resp.status_code,
-                headers=dict(resp.headers)
-            )
-        except httpx.RequestError as e:
-            return JSONResponse(status_code=503, content={"detail": f"Service Unavailable: {str(e)}"})
+ws_hub = WebSocketHub([url.replace("http", "ws", 1) for url in parse_replicas(ORDER_SERVICE)])
+
+# One long-lived pooled client per upstream, opened/closed with the app lifespan
+upstreams = UpstreamPool({
+    "auth": AUTH_SERVICE,
+    "inventory": INVENTORY_SERVICE,
+    "order": ORDER_SERVICE,
+    "analytics": ANALYTICS_SERVICE,
+    "ai": AI_SERVICE,
+})
+
+@app.on_event("startup")
+async def startup_event():
+    await upstreams.startup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ws_hub.stop()
+    await upstreams.shutdown()
+
+def service_unavailable(exc: Exception):
+    if isinstance(exc, UpstreamUnavailable):
+        # Shed fast and tell the client when it is worth trying again
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Service Unavailable: {exc.upstream} {exc.reason}"},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    if isinstance(exc, httpx.TimeoutException):
+        # The route budget ran out before the upstream answered
+        return JSONResponse(status_code=504, content={"detail": f"Gateway Timeout: {str(exc) or 'request deadline exceeded'}"})
+    return JSONResponse(status_code=503, content={"detail": f"Service Unavailable: {str(exc)}"})
+
+async def forward_request(upstream_name: str, path: str, request: Request):
+    upstream = upstreams.get(upstream_name)
+    # Every upstream call made for this request shares the route's budget
+    request.state.deadline = deadline.start(path, request)
+
+    ttl = response_cache.ttl_for(path) if request.method == "GET" else None
+    if ttl:
+        return await cached_forward(upstream, path, request, ttl)
+    if single_flight.applies(path, request):
+        return await coalesced_forward(upstream, path, request)
+    return await stream_forward(upstream, path, request)
+
+async def send_upstream(upstream, path: str, request: Request, identity: bool = False):
+    def build():
+        # Request body is piped upstream as it arrives, nothing is buffered here
+        return upstream.build_request(
+            request.method,
+            path,
+            headers=proxy.upstream_request_headers(request, identity=identity),
+            content=proxy.upstream_request_body(request),
+            params=request.query_params,
+        )
+
+    if hedger.applies(path, request, upstream):
+        return await hedger.send(upstream, build, path, request.state.deadline)
+    return await upstream.send(build(), stream=True, deadline=request.state.deadline)
+
+async def stream_forward(upstream, path: str, request: Request):
+    try:
+        resp = await send_upstream(upstream, path, request)
+    except (httpx.RequestError, UpstreamUnavailable) as e:
+        return service_unavailable(e)
+
+    if request.method in WRITE_METHODS and resp.status_code < 400:
+        response_cache.invalidate_for_write(path)
+
+    # Response is relayed chunk by chunk; the upstream connection goes back
+    # to the pool once the last chunk has been sent.
+    return proxy.relay(resp)
+
+async def fetch_buffered(upstream, path: str, request: Request, limit: int):
+    resp = await send_upstream(upstream, path, request, identity=True)
+    return await proxy.buffer(resp, limit)
+
+async def fetch_shared(upstream, path: str, request: Request, limit: int):
+    # Identical concurrent GETs share one buffered upstream call
+    if not single_flight.applies(path, request):
+        return await fetch_buffered(upstream, path, request, limit)
+    key = request_key(path, request)
+    if single_flight.skipped(key):
+        return await fetch_buffered(upstream, path, request, limit)
+    shared = await single_flight.do(key, lambda: fetch_buffered(upstream, path, request, limit))
+    if isinstance(shared, proxy.UnbufferedResponse):
+        single_flight.skip(key)
+    return shared
+
+async def relay_unbuffered(upstream, path: str, request: Request, unbuffered):
+    resp = unbuffered.claim()
+    if resp is None:
+        # Another caller of the same flight is relaying the one upstream
+        # response, and it can't be shared: fetch our own copy
+        return await stream_forward(upstream, path, request)
+    return proxy.relay(resp)
+
+async def coalesced_forward(upstream, path: str, request: Request):
+    try:
+        shared = await fetch_shared(upstream, path, request, COALESCE_MAX_BYTES)
+    except (httpx.RequestError, UpstreamUnavailable) as e:
+        return service_unavailable(e)
+    if isinstance(shared, proxy.UnbufferedResponse):
+        # Too large to share: relay the response that is already open
+        return await relay_unbuffered(upstream, path, request, shared)
+    return shared.to_response()
+
+async def cached_forward(upstream, path: str, request: Request, ttl: float):
+    request_cc = parse_cache_control(request.headers.get("cache-control"))
+    if "no-store" in request_cc:
+        return await stream_forward(upstream, path, request)
+
+    # no-cache / max-age=0 force a fresh upstream read, which is then stored
+    if "no-cache" not in request_cc and request_cc.get("max-age") != "0":
+        entry = response_cache.lookup(path, request)
+        if entry is not None:
+            return response_cache.respond(entry, request, "HIT")
+
+    try:
+        shared = await fetch_shared(upstream, path, request, response_cache.max_entry_bytes)
+    except (httpx.RequestError, UpstreamUnavailable) as e:
+        return service_unavailable(e)
+    if isinstance(shared, proxy.UnbufferedResponse):
+        # Too large to cache (decided from its headers): stream this response through
+        return await relay_unbuffered(upstream, path, request, shared)
+
+    entry = response_cache.store(path, request, shared.status_code, shared.headers, shared.body, ttl)
+    return response_cache.respond(entry, request, "MISS")
 
 # WebSocket Proxy
 @app.websocket("/ws/{client_id}")
 async def websocket_proxy(client: WebSocket, client_id: str):
-    await client.accept()
-    # Connect to backend WebSocket
-    try:
-        async with websockets.connect(f"{WEBSOCKET_SERVICE}/ws/{client_id}") as target_ws:
-            # Bi-directional forwarding
-            async def forward_client_to_target():
-                try:
-                    while True:
-                        data = await client.receive_text()
-                        await target_ws.send(data)
-                except Exception:
-                    pass
-
-            async def forward_target_to_client():
-                try:
-                    while True:
-                        data = await target_ws.recv()
-                        await client.send_text(data)
-                except Exception:
-                    pass
-
-            await asyncio.gather(forward_client_to_target(), forward_target_to_client())
-    except Exception as e:
-        print(f"WebSocket Error: {e}")
-        await client.close(code=1011)
+    # Clients share the hub's upstream subscription instead of each opening their own
+    await ws_hub.serve(client, client_id)
+
+# Path prefix -> upstream, used to route batch sub-requests
+ROUTE_UPSTREAMS = {
+    "/api/v1/auth/": "auth",
+    "/api/v1/inventory/": "inventory",
+    "/api/v1/suppliers/": "inventory",
+    "/api/v1/orders/": "order",
+    "/api/v1/analytics/": "analytics",
+    "/api/v1/ai/": "ai",
+}
+
+def upstream_for(path: str):
+    for prefix, name in ROUTE_UPSTREAMS.items():
+        if path.startswith(prefix):
+            return upstreams.get(name)
+    return None
+
+# Batch: many API calls in one round trip
+@app.post("/api/v1/batch")
+async def batch_proxy(batch: BatchRequest, request: Request):
+    results = await BatchExecutor(request, upstream_for).run(batch)
+    return {"responses": results}
+
+# Dashboard: analytics, inventory and recent orders in one round trip;
+# sections that fail or time out are reported, the rest still returned
+@app.get("/api/v1/dashboard/composite")
+async def dashboard_composite(request: Request):
+    return await dashboard.composite(request, upstream_for)
 
 # Routes
 @app.api_route("/api/v1/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def auth_proxy(path: str, request: Request):
-    return await forward_request(AUTH_SERVICE, f"/api/v1/auth/{path}", request)
+    return await forward_request("auth", f"/api/v1/auth/{path}", request)
 
 @app.api_route("/api/v1/inventory/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def inventory_proxy(path: str, request: Request):
-    return await forward_request(INVENTORY_SERVICE, f"/api/v1/inventory/{path}", request)
+    return await forward_request("inventory", f"/api/v1/inventory/{path}", request)
     
 @app.api_route("/api/v1/suppliers/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def supplier_proxy(path: str, request: Request):
-    return await forward_request(INVENTORY_SERVICE, f"/api/v1/suppliers/{path}", request)
+    return await forward_request("inventory", f"/api/v1/suppliers/{path}", request)
 
 @app.api_route("/api/v1/orders/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def orders_proxy(path: str, request: Request):
-    return await forward_request(ORDER_SERVICE, f"/api/v1/orders/{path}", request)
+    return await forward_request("order", f"/api/v1/orders/{path}", request)
 
 @app.api_route("/api/v1/analytics/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def analytics_proxy(path: str, request: Request):
-    return await forward_request(ANALYTICS_SERVICE, f"/api/v1/analytics/{path}", request)
+    return await forward_request("analytics", f"/api/v1/analytics/{path}", request)
 
 @app.api_route("/api/v1/ai/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def ai_proxy(path: str, request: Request):
-    return await forward_request(AI_SERVICE, f"/api/v1/ai/{path}", request)
+    return await forward_request("ai", f"/api/v1/ai/{path}", request)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "upstreams": upstreams.stats(),
+        "cache": response_cache.stats(),
+        "coalescing": single_flight.stats(),
+        "hedging": hedger.stats(),
+        "websocket_hub": ws_hub.stats(),
+        "compression": compression_stats.snapshot(),
+        "rate_limit": rate_limiter.stats(),
+        "identity": token_verifier.stats(),
+    }
@@ -0,0 +1,19 @@
+import pytest
+from starlette.requests import Request
+
+
+@pytest.fixture
+def make_request():
+    """A bare Starlette request, as the gateway's route handlers receive it."""
+
+    def make(path: str, headers: dict | None = None, query: str = "", method: str = "GET", client=("10.0.0.1", 5000)):
+        return Request({
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()],
+            "client": client,
+        })
+
+    return make
@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+from app import main
+from app.core import cache, proxy
+from app.core.cache import ResponseCache, etag_matches, parse_cache_control
+
+ROUTES = {"/api/v1/inventory/": 10.0, "/api/v1/inventory/hot": 2.0}
+TOKEN = {"authorization": "Bearer a"}
+
+
+@pytest.fixture
+def response_cache():
+    return ResponseCache(enabled=True, routes=dict(ROUTES), max_bytes=10_000, max_entry_bytes=1_000)
+
+
+def test_ttl_for_longest_prefix(response_cache):
+    assert response_cache.ttl_for("/api/v1/inventory/1") == 10.0
+    assert response_cache.ttl_for("/api/v1/inventory/hot") == 2.0
+    assert response_cache.ttl_for("/api/v1/orders/") is None
+    assert ResponseCache(False, dict(ROUTES), 10, 10).ttl_for("/api/v1/inventory/1") is None
+
+
+def test_etag_matching_is_weak():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert parse_cache_control('No-Cache, max-age="0"') == {"no-cache": None, "max-age": "0"}
+
+
+def test_store_then_revalidate_with_etag(response_cache, make_request):
+    path = "/api/v1/inventory/1"
+    first = make_request(path, TOKEN)
+    entry = response_cache.store(path, first, 200, [("content-type", "application/json")], b'{"id": 1}', 10)
+    miss = response_cache.respond(entry, first, "MISS")
+    etag = miss.headers["etag"]
+    assert miss.status_code == 200 and miss.body == b'{"id": 1}'
+    assert miss.headers["cache-control"] == "no-cache" # Clients keep the body but revalidate
+    assert miss.headers["x-cache"] == "MISS"
+
+    again = make_request(path, {**TOKEN, "if-none-match": etag})
+    hit = response_cache.lookup(path, again)
+    assert hit is entry
+    not_modified = response_cache.respond(hit, again, "HIT")
+    assert not_modified.status_code == 304
+    assert not_modified.body == b""
+    assert not_modified.headers["etag"] == etag
+    assert "content-type" not in not_modified.headers
+    assert not_modified.headers["x-cache"] == "HIT"
+
+    stale_etag = make_request(path, {**TOKEN, "if-none-match": '"other"'})
+    assert response_cache.respond(response_cache.lookup(path, stale_etag), stale_etag, "HIT").status_code == 200
+    assert response_cache.stats()["not_modified"] == 1
+
+
+def test_upstream_etag_and_max_age_are_kept(response_cache, make_request):
+    path = "/api/v1/inventory/1"
+    request = make_request(path, TOKEN)
+    entry = response_cache.store(path, request, 200, [("ETag", '"v7"'), ("Cache-Control", "max-age=3")], b"x", 10)
+    assert entry.etag == '"v7"'
+    assert entry.ttl == 3 # Stricter upstream freshness wins
+
+
+def test_entries_vary_on_credentials(response_cache, make_request):
+    path = "/api/v1/inventory/1"
+    response_cache.store(path, make_request(path, TOKEN), 200, [], b"for a", 10)
+    assert response_cache.lookup(path, make_request(path, {"authorization": "Bearer b"})) is None
+    assert response_cache.lookup(path, make_request(path)) is None
+    assert response_cache.lookup(path, make_request(path, TOKEN)).body == b"for a"
+
+
+@pytest.mark.parametrize("status, headers", [
+    (404, []),
+    (200, [("cache-control", "no-store")]),
+    (200, [("cache-control", "private")]),
+    (200, [("vary", "*")]),
+])
+def test_uncacheable_responses_are_not_kept(response_cache, make_request, status, headers):
+    path = "/api/v1/inventory/1"
+    response_cache.store(path, make_request(path, TOKEN), status, headers, b"x", 10)
+    assert response_cache.lookup(path, make_request(path, TOKEN)) is None
+
+
+def test_expiry_and_write_invalidation(response_cache, make_request, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    path = "/api/v1/inventory/1"
+    response_cache.store(path, make_request(path, TOKEN), 200, [], b"x", 10)
+
+    now[0] += 9
+    assert response_cache.lookup(path, make_request(path, TOKEN)) is not None
+    now[0] += 2
+    assert response_cache.lookup(path, make_request(path, TOKEN)) is None
+
+    response_cache.store(path, make_request(path, TOKEN), 200, [], b"x", 10)
+    response_cache.invalidate_for_write("/api/v1/orders/") # Orders take stock
+    assert response_cache.lookup(path, make_request(path, TOKEN)) is None
+
+
+def test_lru_eviction_by_bytes(make_request):
+    small = ResponseCache(True, dict(ROUTES), max_bytes=250, max_entry_bytes=200)
+    for i in range(3):
+        path = f"/api/v1/inventory/{i}"
+        small.store(path, make_request(path, TOKEN), 200, [], b"x" * 50, 10)
+    assert small.lookup("/api/v1/inventory/0", make_request("/api/v1/inventory/0", TOKEN)) is None
+    assert small.lookup("/api/v1/inventory/2", make_request("/api/v1/inventory/2", TOKEN)) is not None
+    assert small.current_bytes <= 250
+    assert small.evictions >= 1
+
+
+def test_cached_forward_fetches_once_then_answers_304(response_cache, make_request, monkeypatch):
+    fetches = []
+
+    async def fetch_shared(upstream, path, request, limit):
+        fetches.append(path)
+        return proxy.BufferedResponse(200, [("content-type", "application/json")], b'[{"id": 1}]')
+
+    monkeypatch.setattr(main, "response_cache", response_cache)
+    monkeypatch.setattr(main, "fetch_shared", fetch_shared)
+    path = "/api/v1/inventory/"
+
+    async def scenario():
+        miss = await main.cached_forward(None, path, make_request(path, TOKEN), 10)
+        etag = miss.headers["etag"]
+        revalidated = await main.cached_forward(None, path, make_request(path, {**TOKEN, "if-none-match": etag}), 10)
+        forced = await main.cached_forward(None, path, make_request(path, {**TOKEN, "cache-control": "no-cache"}), 10)
+        return miss, revalidated, forced
+
+    miss, revalidated, forced = asyncio.run(scenario())
+    assert (miss.status_code, miss.headers["x-cache"]) == (200, "MISS")
+    assert (revalidated.status_code, revalidated.headers["x-cache"]) == (304, "HIT")
+    assert (forced.status_code, forced.headers["x-cache"]) == (200, "MISS") # no-cache goes upstream again
+    assert len(fetches) == 2
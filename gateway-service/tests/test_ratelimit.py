@@ -0,0 +1,111 @@
+import asyncio
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.core import ratelimit
+from app.core.ratelimit import (
+    Limit, MemoryStore, RateLimiter, RateLimitMiddleware, SQLiteStore, client_key, parse_limits,
+)
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def take_all(store, key, limit, times):
+    async def takes():
+        return [(await store.take(key, limit))[0] for _ in range(times)]
+    return asyncio.run(takes())
+
+
+def test_parse_limits():
+    limits = parse_limits("/api/v1/auth/=2:10, default=50, junk")
+    assert (limits["/api/v1/auth/"].rate, limits["/api/v1/auth/"].burst) == (2.0, 10.0)
+    assert limits["default"].burst == 50.0 # Burst defaults to the rate
+    assert set(limits) == {"/api/v1/auth/", "default"}
+
+
+def test_memory_bucket_allows_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    store, limit = MemoryStore(max_keys=100), Limit("g", rate=2, burst=3)
+
+    assert take_all(store, "a", limit, 4) == [True, True, True, False]
+    clock.now += 1.0 # Two tokens back at 2/s
+    assert take_all(store, "a", limit, 3) == [True, True, False]
+    clock.now += 60 # Refill stops at the burst size
+    assert take_all(store, "a", limit, 4) == [True, True, True, False]
+
+
+def test_memory_buckets_are_per_key_and_bounded(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, "monotonic", Clock())
+    store, limit = MemoryStore(max_keys=2), Limit("g", rate=1, burst=1)
+
+    assert take_all(store, "a", limit, 2) == [True, False]
+    assert take_all(store, "b", limit, 1) == [True]
+    assert take_all(store, "c", limit, 1) == [True] # Evicts "a", the least recently seen
+    assert len(store) == 2
+    assert take_all(store, "a", limit, 1) == [True] # Forgotten, so a full bucket again
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteStore(path, busy_timeout_ms=50), SQLiteStore(path, busy_timeout_ms=50)
+    limit = Limit("g", rate=1, burst=2)
+
+    assert take_all(first, "a", limit, 1) == [True]
+    assert take_all(second, "a", limit, 2) == [True, False]
+    clock.now += 1.0
+    assert take_all(first, "a", limit, 2) == [True, False]
+    assert len(first) == 1
+
+
+def test_sqlite_store_fails_open(tmp_path):
+    store = SQLiteStore(str(tmp_path / "buckets.db"), busy_timeout_ms=50)
+    store._db.execute("DROP TABLE rate_buckets")
+    assert take_all(store, "a", Limit("g", rate=1, burst=1), 3) == [True, True, True]
+
+
+def test_longest_prefix_picks_the_limit():
+    limiter = RateLimiter(True, parse_limits("/api/v1/=10,/api/v1/orders/=1,default=100"), MemoryStore(10))
+    assert limiter.limit_for("/api/v1/orders/5").group == "/api/v1/orders/"
+    assert limiter.limit_for("/api/v1/inventory/").group == "/api/v1/"
+    assert limiter.limit_for("/api/v2/things").group == "default"
+    assert limiter.limit_for("/health") is None
+
+
+def test_client_key_uses_verified_identity_then_ip(monkeypatch):
+    forwarded = [(b"x-forwarded-for", b"203.0.113.9, 10.0.0.2")]
+    scope = {"headers": forwarded, "client": ("10.0.0.1", 5000)}
+    assert client_key(scope) == "ip:10.0.0.1" # Clients can't pick their bucket with a header
+    monkeypatch.setattr(ratelimit, "TRUST_FORWARDED_FOR", True)
+    assert client_key(scope) == "ip:203.0.113.9"
+    assert client_key({**scope, "state": {"identity": {"sub": "ana@example.com"}}}) == "user:ana@example.com"
+
+
+def test_middleware_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, "monotonic", Clock())
+    limiter = RateLimiter(True, parse_limits("default=0.5:2"), MemoryStore(10))
+    app = Starlette(routes=[
+        Route("/api/things", lambda request: PlainTextResponse("ok")),
+        Route("/health", lambda request: PlainTextResponse("ok")),
+    ])
+    client = TestClient(RateLimitMiddleware(app, limiter))
+
+    first = client.get("/api/things")
+    assert first.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert client.get("/api/things").status_code == 200
+    limited = client.get("/api/things")
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "2" # One token at 0.5/s
+    assert client.get("/health").status_code == 200 # Outside /api/, not limited
+    assert limiter.stats()["limited"] == {"default": 1}
@@ -15,6 +15,25 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Accept the gateway's signed X-Verified-Identity instead of decoding the JWT again
+    TRUST_GATEWAY_IDENTITY: bool = True
+    INTERNAL_IDENTITY_SECRET: str = "" # Falls back to SECRET_KEY
+
+    # Stock reservations: holds expire and go back to stock unless committed
+    RESERVATION_TTL_SECONDS: int = 120
+    RESERVATION_MAX_TTL_SECONDS: int = 900
+    RESERVATION_SWEEP_INTERVAL: float = 5.0
+    RESERVATION_SWEEP_BATCH: int = 100
+
+    # Hot products may spread their stock over several rows (see app/inventory/stock.py)
+    STOCK_SHARDING_ENABLED: bool = False
+    STOCK_SHARD_PROBES: int = 3 # Random shards tried before locking them all
+
+    # Comma separated URLs told about product/stock changes (e.g. order-service's product cache)
+    PRODUCT_CHANGE_WEBHOOKS: str = ""
+    PRODUCT_CHANGE_NOTIFY_DELAY: float = 0.1
+    PRODUCT_CHANGE_NOTIFY_TIMEOUT: float = 2.0
+    LOW_STOCK_THRESHOLD: int = 10 # Reported with change notifications for low-stock alerts
     
     model_config = {
         "env_file": ".env",
@@ -4,23 +4,50 @@ from sqlalchemy import select
 from typing import List
 
 from app.db.session import get_db
+from app.core.config import settings
+from app.inventory import stock
+from app.inventory.notifications import product_changes
 from app.inventory.models import Product
-from app.inventory.schemas import ProductCreate, ProductResponse, ProductUpdate
+from app.inventory.schemas import (
+    ProductCreate, ProductResponse, ProductUpdate, ProductBatchRequest, ProductBatchResponse, StockShardUpdate,
+)
 
 router = APIRouter()
 
+async def _with_stock(db: AsyncSession, products: list) -> list:
+    # Sharded products keep their stock in product_stock_shards, not the row
+    if not settings.STOCK_SHARDING_ENABLED:
+        return products
+    sharded = await stock.totals(db, [product.id for product in products])
+    return [
+        ProductResponse.model_validate(product).model_copy(
+            update={"stock_quantity": product.stock_quantity + sharded[product.id]}
+        ) if product.id in sharded else product
+        for product in products
+    ]
+
 @router.post("/", response_model=ProductResponse)
 async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_db)):
     db_product = Product(**product.dict())
     db.add(db_product)
     await db.commit()
     await db.refresh(db_product)
+    product_changes.notify([db_product.id]) # May have been cached as "not found"
     return db_product
 
 @router.get("/", response_model=List[ProductResponse])
 async def list_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Product).offset(skip).limit(limit))
-    return result.scalars().all()
+    return await _with_stock(db, result.scalars().all())
+
+@router.post("/batch", response_model=ProductBatchResponse)
+async def get_products_batch(payload: ProductBatchRequest, db: AsyncSession = Depends(get_db)):
+    # Bulk lookup so callers validate many products in one round trip
+    ids = set(payload.ids)
+    result = await db.execute(select(Product).where(Product.id.in_(ids)))
+    products = result.scalars().all()
+    found = {product.id for product in products}
+    return {"products": await _with_stock(db, products), "missing": sorted(ids - found)}
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
@@ -28,7 +55,7 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
     product = result.scalar_one_or_none()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return (await _with_stock(db, [product]))[0]
 
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(product_id: int, product_update: ProductUpdate, db: AsyncSession = Depends(get_db)):
@@ -37,24 +64,45 @@ async def update_product(product_id: int, product_update: ProductUpdate, db: Asy
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    for key, value in product_update.dict(exclude_unset=True).items():
+    changes = product_update.dict(exclude_unset=True)
+    stock_quantity = changes.pop("stock_quantity", None)
+    for key, value in changes.items():
         setattr(product, key, value)
+    if stock_quantity is not None:
+        await stock.set_total(db, product, stock_quantity)
     
     await db.commit()
+    product_changes.notify([product_id])
     await db.refresh(product)
-    return product
+    return (await _with_stock(db, [product]))[0]
 
 @router.post("/{product_id}/deduct")
 async def deduct_stock(product_id: int, payload: dict, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    product = result.scalar_one_or_none()
+    quantity = payload.get("quantity", 0)
+    # Check and decrement in one conditional UPDATE: no lost updates, no oversell
+    if not await stock.take(db, product_id, quantity):
+        await db.rollback()
+        exists = await db.execute(select(Product.id).where(Product.id == product_id))
+        if exists.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        raise HTTPException(status_code=400, detail="Insufficient stock")
+
+    product = await db.get(Product, product_id)
+    new_quantity = await stock.total(db, product)
+    await db.commit()
+    product_changes.notify([product_id])
+    return {"message": "Stock deducted", "new_quantity": new_quantity}
+
+@router.post("/{product_id}/stock/shards", response_model=ProductResponse)
+async def shard_stock(product_id: int, payload: StockShardUpdate, db: AsyncSession = Depends(get_db)):
+    """Spread a hot product's stock over N rows (N <= 1 merges it back)."""
+    if not settings.STOCK_SHARDING_ENABLED:
+        raise HTTPException(status_code=409, detail="Stock sharding is disabled")
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    quantity = payload.get("quantity", 0)
-    if product.stock_quantity < quantity:
-         raise HTTPException(status_code=400, detail="Insufficient stock")
-         
-    product.stock_quantity -= quantity
+
+    await stock.reshard(db, product, payload.shards)
     await db.commit()
-    return {"message": "Stock deducted", "new_quantity": product.stock_quantity}
+    await db.refresh(product)
+    return (await _with_stock(db, [product]))[0]
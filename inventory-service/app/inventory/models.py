@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, CheckConstraint, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, CheckConstraint, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from datetime import datetime
 
 class Product(Base):
     __tablename__ = "products"
@@ -18,6 +19,22 @@ class Product(Base):
         CheckConstraint('stock_quantity >= 0', name='check_stock_positive'),
     )
 
+class ProductStockShard(Base):
+    """
+    Part of a hot product's stock. A sharded product keeps stock_quantity at 0
+    and its stock spread over these rows, so concurrent deductions lock
+    different rows instead of queueing on one.
+    """
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint('quantity >= 0', name='check_shard_stock_positive'),
+    )
+
 class Supplier(Base):
     __tablename__ = "suppliers"
 
@@ -32,3 +49,24 @@ class Supplier(Base):
 
     # Relationship
     # products = relationship("Product", back_populates="supplier")
+
+class Reservation(Base):
+    """A hold on stock for one order: held -> committed | released | expired."""
+    __tablename__ = "stock_reservations"
+
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="held", index=True)
+    order_ref = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    items = relationship("ReservationItem", lazy="selectin")
+
+class ReservationItem(Base):
+    __tablename__ = "stock_reservation_items"
+
+    id = Column(Integer, primary_key=True)
+    reservation_id = Column(String, ForeignKey("stock_reservations.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False) # Price when reserved, for the caller's totals
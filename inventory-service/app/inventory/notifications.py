@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import json
+import logging
+import httpx
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.identity import SIGNATURE_HEADER, sign_body
+from app.db.session import AsyncSessionLocal
+from app.inventory import stock
+from app.inventory.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Tells other services (order-service's product cache) which products
+# changed. Changes are collected for PRODUCT_CHANGE_NOTIFY_DELAY seconds and
+# sent as one signed POST per subscriber, so a burst of orders on a hot
+# product costs one notification, not one per deduction. Delivery is best
+# effort: subscribers' caches expire on their own anyway. Products left under
+# LOW_STOCK_THRESHOLD are listed too, for order-service's "stock:low" topic.
+
+
+class ProductChangeNotifier:
+    def __init__(self, urls: list, delay: float):
+        self.urls = urls
+        self.delay = delay
+        self._pending: set = set()
+        self._task: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+
+        # Metrics
+        self.sent = 0
+        self.failed = 0
+
+    def notify(self, product_ids):
+        """Call after the change is committed."""
+        if not self.urls:
+            return
+        self._pending.update(product_ids)
+        if self._task is None:
+            # Own context: not tied to the request that made the change
+            self._task = asyncio.create_task(self._flush_later(), context=contextvars.Context())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._task = None
+        product_ids, self._pending = sorted(self._pending), set()
+        if not product_ids:
+            return
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=settings.PRODUCT_CHANGE_NOTIFY_TIMEOUT)
+        try:
+            low_stock = await self._low_stock(product_ids)
+        except Exception as e:
+            logger.warning(f"Low stock check for {product_ids} failed: {e}")
+            low_stock = []
+        body = json.dumps({"product_ids": product_ids, "low_stock": low_stock}).encode()
+        headers = {"Content-Type": "application/json", SIGNATURE_HEADER: sign_body(body)}
+        for url in self.urls:
+            try:
+                response = await self._client.post(url, content=body, headers=headers)
+                if response.status_code >= 400:
+                    raise httpx.HTTPStatusError(f"{response.status_code}", request=response.request, response=response)
+                self.sent += 1
+            except httpx.HTTPError as e:
+                self.failed += 1
+                logger.warning(f"Product change notification to {url} failed: {e}")
+
+    async def _low_stock(self, product_ids: list) -> list:
+        """Changed products now under LOW_STOCK_THRESHOLD, for subscribers' alerts."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Product.id, Product.stock_quantity).where(Product.id.in_(product_ids)))
+            levels = dict(result.all())
+            for product_id, sharded in (await stock.totals(db, product_ids)).items():
+                levels[product_id] = levels.get(product_id, 0) + sharded
+        return [
+            {"product_id": product_id, "stock_quantity": quantity}
+            for product_id, quantity in sorted(levels.items())
+            if quantity < settings.LOW_STOCK_THRESHOLD
+        ]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self.urls), "pending": len(self._pending), "sent": self.sent, "failed": self.failed}
+
+
+product_changes = ProductChangeNotifier(
+    [url.strip() for url in settings.PRODUCT_CHANGE_WEBHOOKS.split(",") if url.strip()],
+    settings.PRODUCT_CHANGE_NOTIFY_DELAY,
+)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db
+from app.inventory import reservations
+from app.inventory.schemas import ReservationCreate, ReservationResponse
+
+router = APIRouter()
+
+@router.post("/", response_model=ReservationResponse, status_code=201)
+async def create_reservation(payload: ReservationCreate, db: AsyncSession = Depends(get_db)):
+    # Atomically holds every line or none; 409 names the first short product
+    return await reservations.reserve(db, payload)
+
+@router.post("/{reservation_id}/commit", response_model=ReservationResponse)
+async def commit_reservation(reservation_id: str, db: AsyncSession = Depends(get_db)):
+    return await reservations.commit(db, reservation_id)
+
+@router.post("/{reservation_id}/release", response_model=ReservationResponse)
+async def release_reservation(reservation_id: str, db: AsyncSession = Depends(get_db)):
+    return await reservations.release(db, reservation_id)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.inventory import stock
+from app.inventory.models import Product, Reservation, ReservationItem
+from app.inventory.notifications import product_changes
+from app.inventory.schemas import ReservationCreate
+
+logger = logging.getLogger(__name__)
+
+# Reserving takes the stock off the shelf straight away. Commit keeps it gone,
+# release (or the sweeper, once the hold expires) puts it back. Every status
+# change is a conditional UPDATE on the current status, so commit, release and
+# the sweeper can race without double-restoring stock. A commit that arrives
+# after the sweeper takes the stock again if it is still there.
+
+
+async def reserve(db: AsyncSession, payload: ReservationCreate) -> Reservation:
+    needed = {}
+    for line in payload.items:
+        needed[line.product_id] = needed.get(line.product_id, 0) + line.quantity
+
+    ttl = min(payload.ttl_seconds or settings.RESERVATION_TTL_SECONDS, settings.RESERVATION_MAX_TTL_SECONDS)
+    reservation = Reservation(
+        id=uuid.uuid4().hex,
+        status="held",
+        order_ref=payload.order_ref,
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+    )
+
+    prices = dict((await db.execute(select(Product.id, Product.price).where(Product.id.in_(needed)))).all())
+    missing = sorted(set(needed) - set(prices))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Product {missing[0]} not found")
+
+    # Rows are locked in id order so two multi-SKU reservations can't deadlock
+    for product_id in sorted(needed):
+        quantity = needed[product_id]
+        if not await stock.take(db, product_id, quantity):
+            # All or nothing: undo the lines already taken
+            await db.rollback()
+            raise HTTPException(status_code=409, detail=f"Insufficient stock for product {product_id}")
+        reservation.items.append(ReservationItem(product_id=product_id, quantity=quantity, price=prices[product_id]))
+
+    db.add(reservation)
+    await db.commit()
+    product_changes.notify(needed)
+    return reservation
+
+
+async def _restore(db: AsyncSession, reservation_id: str, status: str) -> bool:
+    """Move a held reservation to status and return its stock; False if it wasn't held."""
+    result = await db.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation_id, Reservation.status == "held")
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        return False
+
+    items = await db.execute(select(ReservationItem).where(ReservationItem.reservation_id == reservation_id))
+    items = sorted(items.scalars().all(), key=lambda i: i.product_id)
+    for item in items:
+        await stock.give(db, item.product_id, item.quantity)
+    await db.commit()
+    product_changes.notify(item.product_id for item in items)
+    return True
+
+
+async def _get(db: AsyncSession, reservation_id: str) -> Reservation:
+    reservation = await db.get(Reservation, reservation_id, populate_existing=True)
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+
+async def _retake(db: AsyncSession, reservation_id: str) -> bool:
+    """Commit an expired hold whose stock went back, if it is all still there."""
+    result = await db.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation_id, Reservation.status == "expired")
+        .values(status="committed")
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        return False
+
+    items = await db.execute(select(ReservationItem).where(ReservationItem.reservation_id == reservation_id))
+    items = sorted(items.scalars().all(), key=lambda i: i.product_id)
+    for item in items:
+        if not await stock.take(db, item.product_id, item.quantity):
+            await db.rollback()
+            return False
+    await db.commit()
+    product_changes.notify(item.product_id for item in items)
+    return True
+
+
+async def commit(db: AsyncSession, reservation_id: str) -> Reservation:
+    # A held reservation still has its stock, so it commits even past
+    # expires_at as long as the sweeper hasn't got to it
+    result = await db.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation_id, Reservation.status == "held")
+        .values(status="committed")
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    reservation = await _get(db, reservation_id)
+    if result.rowcount == 0 and reservation.status == "expired":
+        # Late commit (e.g. inventory was unreachable for longer than the hold)
+        await _retake(db, reservation_id)
+        reservation = await _get(db, reservation_id)
+    if result.rowcount == 0 and reservation.status != "committed":
+        # Committing twice is fine; committing a hold that is gone is not
+        raise HTTPException(status_code=409, detail=f"Reservation is {reservation.status}")
+    return reservation
+
+
+async def release(db: AsyncSession, reservation_id: str) -> Reservation:
+    await _restore(db, reservation_id, "released")
+    reservation = await _get(db, reservation_id)
+    if reservation.status == "committed":
+        raise HTTPException(status_code=409, detail="Reservation is already committed")
+    return reservation
+
+
+async def sweep_expired(limit: int) -> int:
+    """Return the stock of up to limit expired holds; returns how many."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Reservation.id)
+            .where(Reservation.status == "held", Reservation.expires_at <= datetime.utcnow())
+            .order_by(Reservation.expires_at)
+            .limit(limit)
+        )
+        swept = 0
+        for reservation_id in result.scalars().all():
+            if await _restore(db, reservation_id, "expired"):
+                swept += 1
+        return swept
+
+
+async def run_sweeper():
+    while True:
+        try:
+            swept = await sweep_expired(settings.RESERVATION_SWEEP_BATCH)
+            if swept:
+                logger.info(f"Returned stock for {swept} expired reservation(s)")
+            if swept == settings.RESERVATION_SWEEP_BATCH:
+                continue # More waiting, don't sleep
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Reservation sweep failed: {e}")
+        await asyncio.sleep(settings.RESERVATION_SWEEP_INTERVAL)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
 
 class ProductBase(BaseModel):
     name: str
@@ -14,6 +15,9 @@ class ProductCreate(ProductBase):
 class StockUpdate(BaseModel):
     quantity_delta: int
 
+class StockShardUpdate(BaseModel):
+    shards: int = Field(ge=1, le=64)
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -25,3 +29,35 @@ class ProductResponse(ProductBase):
     id: int
     
     model_config = ConfigDict(from_attributes=True)
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=500)
+
+class ProductBatchResponse(BaseModel):
+    products: List[ProductResponse]
+    missing: List[int] = []
+
+class ReservationLine(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class ReservationCreate(BaseModel):
+    items: List[ReservationLine] = Field(min_length=1, max_length=500)
+    ttl_seconds: Optional[int] = Field(default=None, gt=0)
+    order_ref: Optional[str] = None
+
+class ReservationItemResponse(BaseModel):
+    product_id: int
+    quantity: int
+    price: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ReservationResponse(BaseModel):
+    id: str
+    status: str
+    order_ref: Optional[str] = None
+    expires_at: datetime
+    items: List[ReservationItemResponse]
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from app.inventory import stock
 from app.inventory.models import Product
+from app.inventory.notifications import product_changes
 from app.inventory.schemas import ProductCreate, ProductUpdate
 from app.utils.exceptions import NotFoundException
 
@@ -17,17 +19,23 @@ async def get_product(db: AsyncSession, product_id: int):
 
 async def update_stock(db: AsyncSession, product_id: int, quantity_change: int):
     # This function changes stock by quantity_change (positive to add, negative to reduce)
-    # It assumes validation happens before or handles the check constraint error
+    # Reductions are one conditional UPDATE, so concurrent callers can't oversell
+    if quantity_change >= 0:
+        await stock.give(db, product_id, quantity_change)
+        applied = True
+    else:
+        applied = await stock.take(db, product_id, -quantity_change)
+
     product = await get_product(db, product_id)
     if not product:
+        await db.rollback()
         raise NotFoundException("Product not found")
-    
-    product.stock_quantity += quantity_change
-    if product.stock_quantity < 0:
-        # Should be caught by CheckConstraint ideally, but app level check safe
+    if not applied:
+        await db.rollback()
         raise ValueError("Insufficient stock")
     
     await db.commit()
+    product_changes.notify([product_id])
     await db.refresh(product)
     return product
 
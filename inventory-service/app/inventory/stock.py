@@ -0,0 +1,144 @@
+import random
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.inventory.models import Product, ProductStockShard
+
+# All stock changes go through here as single conditional UPDATEs: the check
+# and the decrement happen in one statement, so concurrent orders can neither
+# oversell nor hold a row lock across a read-modify-write round trip.
+#
+# With STOCK_SHARDING_ENABLED a hot product can be split into N shard rows.
+# A deduction then tries a few random shards, each a conditional UPDATE on a
+# different row, and only when stock is too fragmented does it lock every
+# shard of the product and take from several.
+
+
+def _no_sync(statement):
+    return statement.execution_options(synchronize_session=False)
+
+
+async def _shard_ids(db: AsyncSession, product_id: int) -> list:
+    result = await db.execute(select(ProductStockShard.shard).where(ProductStockShard.product_id == product_id))
+    return list(result.scalars().all())
+
+
+async def _take_from_shards(db: AsyncSession, product_id: int, quantity: int, shards: list) -> bool:
+    for shard in random.sample(shards, min(len(shards), settings.STOCK_SHARD_PROBES)):
+        result = await db.execute(_no_sync(
+            update(ProductStockShard)
+            .where(
+                ProductStockShard.product_id == product_id,
+                ProductStockShard.shard == shard,
+                ProductStockShard.quantity >= quantity,
+            )
+            .values(quantity=ProductStockShard.quantity - quantity)
+        ))
+        if result.rowcount:
+            return True
+
+    # Slow path: no single shard had enough, drain several under lock
+    result = await db.execute(
+        select(ProductStockShard)
+        .where(ProductStockShard.product_id == product_id)
+        .order_by(ProductStockShard.shard)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    rows = result.scalars().all()
+    if sum(row.quantity for row in rows) < quantity:
+        return False
+    remaining = quantity
+    for row in rows:
+        taken = min(row.quantity, remaining)
+        row.quantity -= taken
+        remaining -= taken
+        if not remaining:
+            break
+    await db.flush()
+    return True
+
+
+async def take(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    """Deduct quantity if that much is in stock. Caller commits."""
+    result = await db.execute(_no_sync(
+        update(Product)
+        .where(Product.id == product_id, Product.stock_quantity >= quantity)
+        .values(stock_quantity=Product.stock_quantity - quantity)
+    ))
+    if result.rowcount:
+        return True
+    if not settings.STOCK_SHARDING_ENABLED:
+        return False
+    shards = await _shard_ids(db, product_id)
+    return bool(shards) and await _take_from_shards(db, product_id, quantity, shards)
+
+
+async def give(db: AsyncSession, product_id: int, quantity: int):
+    """Put quantity back into stock. Caller commits."""
+    shards = await _shard_ids(db, product_id) if settings.STOCK_SHARDING_ENABLED else []
+    if shards:
+        await db.execute(_no_sync(
+            update(ProductStockShard)
+            .where(ProductStockShard.product_id == product_id, ProductStockShard.shard == random.choice(shards))
+            .values(quantity=ProductStockShard.quantity + quantity)
+        ))
+        return
+    await db.execute(_no_sync(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock_quantity=Product.stock_quantity + quantity)
+    ))
+
+
+async def totals(db: AsyncSession, product_ids: list) -> dict:
+    """Sharded stock per product id (only products that have shards)."""
+    if not settings.STOCK_SHARDING_ENABLED or not product_ids:
+        return {}
+    result = await db.execute(
+        select(ProductStockShard.product_id, func.sum(ProductStockShard.quantity))
+        .where(ProductStockShard.product_id.in_(product_ids))
+        .group_by(ProductStockShard.product_id)
+    )
+    return {product_id: int(total) for product_id, total in result.all()}
+
+
+async def total(db: AsyncSession, product: Product) -> int:
+    return product.stock_quantity + (await totals(db, [product.id])).get(product.id, 0)
+
+
+async def reshard(db: AsyncSession, product: Product, shards: int, stock_total: int | None = None):
+    """
+    Spread a product's stock (or stock_total, when setting it) evenly over
+    shards rows; shards <= 1 folds everything back into the product row.
+    Locks the product and its shards. Caller commits.
+    """
+    await db.execute(select(Product.id).where(Product.id == product.id).with_for_update())
+    current = await db.execute(
+        select(ProductStockShard.quantity).where(ProductStockShard.product_id == product.id).with_for_update()
+    )
+    sharded = sum(current.scalars().all())
+    if stock_total is None:
+        await db.refresh(product, ["stock_quantity"])
+        stock_total = product.stock_quantity + sharded
+
+    await db.execute(_no_sync(delete(ProductStockShard).where(ProductStockShard.product_id == product.id)))
+    if shards <= 1:
+        product.stock_quantity = stock_total
+    else:
+        product.stock_quantity = 0
+        base, extra = divmod(stock_total, shards)
+        await db.execute(insert(ProductStockShard), [
+            {"product_id": product.id, "shard": shard, "quantity": base + (1 if shard < extra else 0)}
+            for shard in range(shards)
+        ])
+    await db.flush()
+
+
+async def set_total(db: AsyncSession, product: Product, stock_total: int):
+    """Set a product's stock, keeping its current shard count."""
+    shards = len(await _shard_ids(db, product.id)) if settings.STOCK_SHARDING_ENABLED else 0
+    if shards:
+        await reshard(db, product, shards, stock_total)
+    else:
+        product.stock_quantity = stock_total
@@ -1,10 +1,25 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from app.core.deadline import DeadlineMiddleware, DeadlineExceeded
 from app.inventory.api import router as inventory_router
 # We will create supplier router next
 from app.inventory.supplier_api import router as supplier_router
+from app.inventory.reservation_api import router as reservation_router
+from app.inventory.reservations import run_sweeper
+from app.inventory.notifications import product_changes
+import asyncio
 
 app = FastAPI(title="Inventory Service")
 
+# Honour the caller's remaining budget (X-Request-Timeout-Ms) on every request
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+# Registered before the product routes so "/reservations" isn't taken for a product id
+app.include_router(reservation_router, prefix="/api/v1/inventory/reservations", tags=["reservations"])
 app.include_router(inventory_router, prefix="/api/v1/inventory", tags=["inventory"])
 app.include_router(supplier_router, prefix="/api/v1/suppliers", tags=["suppliers"])
 
@@ -14,7 +29,18 @@ async def startup_event():
     from app.db.base import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Expired stock holds go back to stock in the background
+    app.state.reservation_sweeper = asyncio.create_task(run_sweeper())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.reservation_sweeper.cancel()
+    await product_changes.close()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    return {"product_changes": product_changes.stats()}
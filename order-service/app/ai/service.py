@@ -1,6 +1,7 @@
 from app.db.session import AsyncSessionLocal
 from app.ai.client import ai_client
 from app.ai.models import OrderAIMetadata
+from app.core import deadline
 from app.orders.models import Order
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -17,6 +18,9 @@ async def process_order_ai(order_id: int):
     if not ai_client.enabled:
         return
 
+    # Runs after the response was sent; the request's deadline no longer applies
+    deadline.detach()
+
     logger.info(f"Starting AI processing for Order {order_id}")
     
     async with AsyncSessionLocal() as db:
@@ -37,19 +41,18 @@ async def process_order_ai(order_id: int):
             # In a real app, we'd fetch product names too, but IDs are fine for this demo
             # Fetch product names for better AI context
             item_details_list = []
+            try:
+                # One bulk lookup instead of a call per line
+                from app.core.service_clients import inventory_client
+                products = await inventory_client.get_products([item.product_id for item in order.items])
+            except Exception:
+                products = {}
             for item in order.items:
-                try:
-                     # We use inventory_client. Since this is async, we can do it.
-                     # Note: ai/service.py needs to import inventory_client
-                     # To avoid circular imports if any, verify. 
-                     # service.py imports from app.db, app.ai, app.orders. 
-                     # inventory_client is in app.core.
-                     from app.core.service_clients import inventory_client
-                     product = await inventory_client.get_product(item.product_id)
-                     name = product.name if product else f"Product_{item.product_id}"
-                     item_details_list.append(f"{item.quantity}x {name}")
-                except Exception:
-                     item_details_list.append(f"{item.quantity}x Product_ID:{item.product_id}")
+                product = products.get(item.product_id)
+                if product:
+                    item_details_list.append(f"{item.quantity}x {product.name}")
+                else:
+                    item_details_list.append(f"{item.quantity}x Product_ID:{item.product_id}")
             
             item_details = ", ".join(item_details_list)
             
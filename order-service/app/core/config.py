@@ -15,6 +15,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Accept the gateway's signed X-Verified-Identity instead of decoding the JWT again
+    TRUST_GATEWAY_IDENTITY: bool = True
+    INTERNAL_IDENTITY_SECRET: str = "" # Falls back to SECRET_KEY
     
     model_config = {
         "env_file": ".env",
@@ -24,6 +27,33 @@ class Settings(BaseSettings):
     # Internal Services
     INVENTORY_SERVICE_URL: str
     AUTH_SERVICE_URL: str
+    # Default timeout for internal calls, capped by the request deadline
+    INTERNAL_HTTP_TIMEOUT: float = 10.0
+    INTERNAL_HTTP_CONNECT_TIMEOUT: float = 2.0
+    # One keep-alive pool shared by all internal calls (see app/core/http_client.py)
+    INTERNAL_HTTP_MAX_CONNECTIONS: int = 100
+    INTERNAL_HTTP_MAX_KEEPALIVE: int = 20
+    INTERNAL_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    # Extra attempts for idempotent calls, with jittered exponential backoff
+    INTERNAL_HTTP_RETRIES: int = 2
+    INTERNAL_HTTP_RETRY_BACKOFF: float = 0.05
+    # Hedge slow product reads to a second inventory replica (needs a comma separated INVENTORY_SERVICE_URL)
+    INVENTORY_HEDGE_ENABLED: bool = False
+    HEDGE_MAX_PERCENT: float = 10.0
+    # Product details cache (see app/core/product_cache.py); stock is always checked by inventory-service
+    PRODUCT_CACHE_ENABLED: bool = True
+    PRODUCT_CACHE_TTL: float = 60.0
+    PRODUCT_CACHE_NEGATIVE_TTL: float = 5.0
+    PRODUCT_CACHE_STALE_SECONDS: float = 300.0 # Served stale while refreshing in the background
+    PRODUCT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Order events (see app/orders/outbox.py): "name=url,..." HTTP consumers, plus WebSocket clients
+    OUTBOX_CONSUMERS: str = ""
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0 # Fallback; commits wake the dispatcher straight away
+    OUTBOX_RETRY_MAX_DELAY: float = 30.0
+    OUTBOX_CLAIM_TIMEOUT: float = 60.0 # A claimed batch goes back to the queue if not delivered by then
+    OUTBOX_RETENTION_HOURS: float = 24.0 # Delivered events are kept this long
 
     # AI
     AI_API_KEY: str = ""
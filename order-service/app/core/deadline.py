@@ -0,0 +1,92 @@
+import contextvars
+import time
+from starlette.responses import JSONResponse
+
+# Remaining request budget in milliseconds, set by the gateway from its
+# per-route budgets and re-computed on every hop.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class DeadlineMiddleware:
+    """Pick up the caller's remaining budget so downstream work can honour it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = None
+        for name, raw in scope["headers"]:
+            if name == DEADLINE_HEADER.lower().encode():
+                value = raw.decode("latin-1")
+                break
+
+        try:
+            budget_ms = float(value) if value is not None else None
+        except ValueError:
+            budget_ms = None
+
+        if budget_ms is None:
+            await self.app(scope, receive, send)
+            return
+
+        if budget_ms <= 0:
+            # The caller has already given up, don't start any work
+            response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+            await response(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + budget_ms / 1000)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left for the current request, or None without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """Timeout for an outgoing call: the default, capped by the request budget."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(default, left)
+
+
+def propagate(headers: dict | None = None) -> dict:
+    """Headers for an internal call, carrying the remaining budget along."""
+    headers = dict(headers or {})
+    left = remaining()
+    if left is not None:
+        headers[DEADLINE_HEADER] = str(max(0, int(left * 1000)))
+    return headers
+
+
+def statement_timeout_ms() -> int | None:
+    left = remaining()
+    if left is None:
+        return None
+    # Postgres treats 0 as "no timeout", so never go below 1ms
+    return max(1, int(left * 1000))
+
+
+def detach():
+    """Background work outlives the request; drop its deadline."""
+    _deadline.set(None)
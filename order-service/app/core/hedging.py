@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for one kind of call."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self._p95 = None
+        self._dirty = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self._dirty += 1
+
+    def p95(self) -> float | None:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        # Re-sorting on every call is wasteful, refresh every few samples
+        if self._p95 is None or self._dirty >= 10:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._dirty = 0
+        return self._p95
+
+
+class Hedger:
+    """
+    Runs an idempotent call against one replica and, if it has not answered
+    by the observed p95, against a second one. The first success wins and
+    the other attempt is cancelled.
+    """
+
+    def __init__(self, enabled: bool, max_percent: float):
+        self.enabled = enabled
+        self.max_ratio = max_percent / 100
+        self.tracker = LatencyTracker()
+        # Hedge budget: every call earns max_ratio of a hedge
+        self._budget = 0.0
+
+        # Metrics
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _take_budget(self) -> bool:
+        if self._budget >= 1:
+            self._budget -= 1
+            return True
+        return False
+
+    async def run(self, call, replicas: list):
+        """call(base_url) -> awaitable; replicas is the list of base URLs."""
+        self.calls += 1
+        self._budget = min(self._budget + self.max_ratio, 10)
+        order = random.sample(replicas, len(replicas))
+
+        async def attempt(base_url):
+            started = time.monotonic()
+            result = await call(base_url)
+            self.tracker.record(time.monotonic() - started)
+            return result
+
+        delay = self.tracker.p95()
+        if not self.enabled or len(order) < 2 or delay is None:
+            return await attempt(order[0])
+
+        first = asyncio.ensure_future(attempt(order[0]))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._take_budget():
+                return await first
+
+            self.hedged += 1
+            second = asyncio.ensure_future(attempt(order[1]))
+            tasks.add(second)
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        p95 = self.tracker.p95()
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_ratio": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+        }
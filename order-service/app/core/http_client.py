@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+import httpx
+from app.core import deadline
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Answers worth another try: the peer is restarting or overloaded
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class TargetStats:
+    __slots__ = ("requests", "errors", "retries", "latency_total", "latency_max", "statuses")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.statuses: dict = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_latency_ms": round(self.latency_total / self.requests * 1000, 3) if self.requests else 0.0,
+            "max_latency_ms": round(self.latency_max * 1000, 3),
+            "statuses": dict(self.statuses),
+        }
+
+
+class InternalHTTPClient:
+    """
+    One pooled, keep-alive client for every service-to-service call. Opened
+    at startup and closed at shutdown; used before startup (scripts, tests)
+    it opens itself on first use.
+    """
+
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+        self.targets: dict = {} # "host:port" -> TargetStats
+
+    def open(self):
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.INTERNAL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.INTERNAL_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.INTERNAL_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.INTERNAL_HTTP_TIMEOUT, connect=settings.INTERNAL_HTTP_CONNECT_TIMEOUT),
+        )
+
+    async def close(self):
+        client, self.client = self.client, None
+        if client is not None:
+            await client.aclose()
+
+    def _stats_for(self, url: str) -> TargetStats:
+        target = urlsplit(url).netloc
+        stats = self.targets.get(target)
+        if stats is None:
+            stats = self.targets[target] = TargetStats()
+        return stats
+
+    async def request(self, method: str, url: str, *, retries: int | None = None, idempotent: bool | None = None,
+                      timeout: float | None = None, headers: dict | None = None, use_deadline: bool = True,
+                      **kwargs) -> httpx.Response:
+        """
+        Send with the caller's deadline attached (unless use_deadline=False,
+        for calls that must land even after the caller gave up). Idempotent
+        calls (by method, or idempotent=True for endpoints that are safe to
+        repeat) are retried on connection errors and 502/503/504 with
+        jittered backoff.
+        """
+        self.open()
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = (1 + (settings.INTERNAL_HTTP_RETRIES if retries is None else retries)) if idempotent else 1
+        stats = self._stats_for(url)
+
+        for attempt in range(attempts):
+            if attempt:
+                stats.retries += 1
+                # Full jitter so callers that failed together don't retry together
+                backoff = random.uniform(0, settings.INTERNAL_HTTP_RETRY_BACKOFF * 2 ** (attempt - 1))
+                left = deadline.remaining() if use_deadline else None
+                if left is not None and left <= backoff:
+                    break
+                await asyncio.sleep(backoff)
+
+            started = time.monotonic()
+            stats.requests += 1
+            try:
+                response = await self.client.request(
+                    method,
+                    url,
+                    headers=deadline.propagate(headers) if use_deadline else headers,
+                    timeout=deadline.timeout(timeout or settings.INTERNAL_HTTP_TIMEOUT) if use_deadline else timeout,
+                    **kwargs,
+                )
+            except httpx.RequestError as e:
+                stats.errors += 1
+                error = e
+                response = None
+            finally:
+                elapsed = time.monotonic() - started
+                stats.latency_total += elapsed
+                stats.latency_max = max(stats.latency_max, elapsed)
+
+            if response is not None:
+                stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+                if response.status_code not in RETRY_STATUSES or attempt + 1 == attempts:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+            elif attempt + 1 < attempts:
+                logger.warning(f"{method} {url} failed: {error}, retrying")
+
+        if response is not None:
+            return response
+        raise error
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {target: stats.to_dict() for target, stats in self.targets.items()}
+
+
+internal_http = InternalHTTPClient()
@@ -0,0 +1,51 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from fastapi import Request
+from app.core.config import settings
+
+# Set by the gateway after it has verified the caller's bearer token:
+# "<base64url claims>.<base64url HMAC-SHA256>". Trusting it lets a service
+# skip its own jwt.decode; without it the token is decoded as before.
+IDENTITY_HEADER = "X-Verified-Identity"
+
+
+def _unb64(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def verified_claims(request: Request) -> dict | None:
+    """The gateway-verified claims for this request, or None to fall back."""
+    if not settings.TRUST_GATEWAY_IDENTITY:
+        return None
+    value = request.headers.get(IDENTITY_HEADER)
+    if not value or value.count(".") != 1:
+        return None
+    payload, signature = value.split(".")
+    secret = settings.INTERNAL_IDENTITY_SECRET or settings.SECRET_KEY
+    expected = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, _unb64(signature)):
+            return None
+        claims = json.loads(_unb64(payload))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+
+# Service-to-service notifications (e.g. product changes) carry an HMAC of
+# their body under the same shared secret.
+SIGNATURE_HEADER = "X-Internal-Signature"
+
+
+def sign_body(body: bytes) -> str:
+    secret = settings.INTERNAL_IDENTITY_SECRET or settings.SECRET_KEY
+    return base64.urlsafe_b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode().rstrip("=")
+
+
+def verify_body(body: bytes, signature: str | None) -> bool:
+    return bool(signature) and hmac.compare_digest(sign_body(body).encode(), signature.encode("latin-1"))
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Descriptive product data (name, price, ...) barely changes, so lookups are
+# served from here. Entries live PRODUCT_CACHE_TTL seconds, 404s are
+# remembered for PRODUCT_CACHE_NEGATIVE_TTL, and for PRODUCT_CACHE_STALE_SECONDS
+# past expiry an entry is still served while a background refresh runs.
+# inventory-service drops entries early by notifying product changes.
+# Stock is never decided from here: reservations check it in inventory-service.
+
+
+class ProductCache:
+    def __init__(self, enabled: bool, ttl: float, negative_ttl: float, stale_seconds: float, max_entries: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        # product_id -> (expires_at, data or None for "not found")
+        self._entries: OrderedDict = OrderedDict()
+        # product_id -> token of the load in flight; an invalidation drops it so
+        # a load that started before the change doesn't store the old data
+        self._loading: dict = {}
+        self._refreshing: set = set()
+
+        # Metrics
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _lookup(self, product_id: int, now: float):
+        """("fresh" | "stale" | None, data)."""
+        entry = self._entries.get(product_id)
+        if entry is None:
+            return None, None
+        expires_at, data = entry
+        if now < expires_at:
+            self._entries.move_to_end(product_id)
+            return "fresh", data
+        if data is not None and now < expires_at + self.stale_seconds:
+            return "stale", data
+        return None, None
+
+    def _begin(self, product_id: int) -> object:
+        token = self._loading[product_id] = object()
+        return token
+
+    def _store(self, product_id: int, data: dict | None, token: object):
+        if self._loading.get(product_id) is not token:
+            return # Invalidated (or superseded) while loading
+        del self._loading[product_id]
+        ttl = self.ttl if data is not None else self.negative_ttl
+        self._entries[product_id] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, state: str, data):
+        if state == "stale":
+            self.stale_hits += 1
+        elif data is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+
+    async def get_many(self, product_ids, load) -> dict:
+        """
+        product_id -> data (None when not found). load(ids) must return
+        {product_id: data} for the ids that exist.
+        """
+        if not self.enabled:
+            found = await load(list(product_ids))
+            return {product_id: found.get(product_id) for product_id in product_ids}
+
+        now = time.monotonic()
+        results, missing, stale = {}, [], []
+        for product_id in product_ids:
+            state, data = self._lookup(product_id, now)
+            if state is None:
+                missing.append(product_id)
+                continue
+            self._count(state, data)
+            results[product_id] = data
+            if state == "stale" and product_id not in self._refreshing:
+                stale.append(product_id)
+
+        if stale:
+            self._refreshing.update(stale)
+            # Own context: the refresh must not inherit this request's deadline
+            asyncio.create_task(self._refresh(stale, load), context=contextvars.Context())
+
+        if missing:
+            self.misses += len(missing)
+            tokens = {product_id: self._begin(product_id) for product_id in missing}
+            found = await load(missing)
+            for product_id in missing:
+                results[product_id] = found.get(product_id)
+                self._store(product_id, results[product_id], tokens[product_id])
+        return results
+
+    async def _refresh(self, product_ids: list, load):
+        tokens = {product_id: self._begin(product_id) for product_id in product_ids}
+        try:
+            found = await load(product_ids)
+            for product_id in product_ids:
+                self._store(product_id, found.get(product_id), tokens[product_id])
+        except Exception as e:
+            logger.warning(f"Background refresh of products {product_ids} failed: {e}")
+        finally:
+            self._refreshing.difference_update(product_ids)
+
+    def invalidate(self, product_ids):
+        for product_id in product_ids:
+            self._entries.pop(product_id, None)
+            self._loading.pop(product_id, None)
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+product_cache = ProductCache(
+    enabled=settings.PRODUCT_CACHE_ENABLED,
+    ttl=settings.PRODUCT_CACHE_TTL,
+    negative_ttl=settings.PRODUCT_CACHE_NEGATIVE_TTL,
+    stale_seconds=settings.PRODUCT_CACHE_STALE_SECONDS,
+    max_entries=settings.PRODUCT_CACHE_MAX_ENTRIES,
+)
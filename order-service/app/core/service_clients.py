@@ -1,58 +1,87 @@
 import httpx
 from app.core.config import settings
+from app.core.hedging import Hedger
+from app.core.http_client import internal_http
+from app.core.product_cache import product_cache
 from fastapi import HTTPException
+from types import SimpleNamespace
 import logging
 
 logger = logging.getLogger(__name__)
 
 class InventoryClient:
     def __init__(self):
-        self.base_url = settings.INVENTORY_SERVICE_URL
-        
+        # INVENTORY_SERVICE_URL may list several replicas, comma separated
+        self.replicas = [url.strip().rstrip("/") for url in settings.INVENTORY_SERVICE_URL.split(",") if url.strip()]
+        self.base_url = self.replicas[0]
+        self.hedger = Hedger(enabled=settings.INVENTORY_HEDGE_ENABLED, max_percent=settings.HEDGE_MAX_PERCENT)
+
+    async def _fetch_product(self, base_url: str, product_id: int):
+        return await internal_http.get(f"{base_url}/{product_id}")
+
+    async def _load_product(self, product_id: int) -> dict:
+        try:
+            # Idempotent read: may be hedged to a second replica when slow
+            response = await self.hedger.run(
+                lambda base_url: self._fetch_product(base_url, product_id),
+                self.replicas,
+            )
+        except httpx.RequestError as e:
+            logger.error(f"Connection error to Inventory Service: {e}")
+            raise HTTPException(status_code=503, detail="Inventory Service Unavailable")
+        if response.status_code == 404:
+            return {}
+        if response.status_code != 200:
+            logger.error(f"Failed to fetch product {product_id}: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch product from Inventory Service")
+        return {product_id: response.json()}
+
+    async def _load_products(self, product_ids: list) -> dict:
+        if len(product_ids) == 1:
+            return await self._load_product(product_ids[0])
+        try:
+            # POST, but a pure read: safe to retry
+            response = await internal_http.post(
+                f"{self.base_url}/batch", json={"ids": sorted(set(product_ids))}, idempotent=True
+            )
+        except httpx.RequestError as e:
+            logger.error(f"Connection error to Inventory Service: {e}")
+            raise HTTPException(status_code=503, detail="Inventory Service Unavailable")
+        if response.status_code != 200:
+            logger.error(f"Failed to fetch products {product_ids}: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch products from Inventory Service")
+        return {product["id"]: product for product in response.json()["products"]}
+
     async def get_product(self, product_id: int):
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{self.base_url}/api/v1/inventory/{product_id}")
-                if response.status_code == 404:
-                    return None
-                if response.status_code != 200:
-                    logger.error(f"Failed to fetch product {product_id}: {response.text}")
-                    raise HTTPException(status_code=response.status_code, detail="Failed to fetch product from Inventory Service")
-                
-                # We need to return an object that mimics the SQLAlchemy model for compatibility if possible,
-                # or better, return a Pydantic model and update service.py to use attribute access or dict access.
-                # The existing code uses dot notation (product.stock_quantity).
-                # So we can return a SimpleNamespace or a Pydantic model.
-                from types import SimpleNamespace
-                data = response.json()
-                return SimpleNamespace(**data)
-            except httpx.RequestError as e:
-                logger.error(f"Connection error to Inventory Service: {e}")
-                raise HTTPException(status_code=503, detail="Inventory Service Unavailable")
+        """
+        Product details as attributes (like the ORM model), or None. Served
+        from the product cache: fine for names and prices, never for deciding
+        whether stock is available.
+        """
+        return (await self.get_products([product_id])).get(product_id)
+
+    async def get_products(self, product_ids) -> dict:
+        """Products by id, cached ones locally and the rest in one round trip; missing ids are left out."""
+        found = await product_cache.get_many(list(dict.fromkeys(product_ids)), self._load_products)
+        return {product_id: SimpleNamespace(**data) for product_id, data in found.items() if data is not None}
 
     async def update_stock(self, product_id: int, quantity_delta: int):
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.put(
-                    f"{self.base_url}/api/v1/inventory/{product_id}/stock",
-                    json={"quantity_delta": quantity_delta}
-                )
-                if response.status_code != 200:
-                     # If 400, strictly it might be insufficient stock if logic is moved there?
-                     # But current inventory service logic just updates.
-                     # Wait, we need to handle "Insufficient stock" logic.
-                     # In microservices, Order Service checks stock first (GET), then reserves (PUT).
-                     # There is a race condition here without reservation pattern or distributed lock.
-                     # Requirement says "Production hardened".
-                     # Ideally: `POST /reserve` which decrements atomically and returns 400 if < 0.
-                     # My current Inventory Service `update_stock` just decrements.
-                     # If I use `quantity_delta=-1`, does it check bounds?
-                     # I need to verify `inventory_service.update_stock` implementation.
-                     logger.error(f"Failed to update stock for {product_id}: {response.text}")
-                     raise HTTPException(status_code=response.status_code, detail="Failed to update stock")
-                return True
-            except httpx.RequestError as e:
-                logger.error(f"Connection error to Inventory Service: {e}")
-                raise HTTPException(status_code=503, detail="Inventory Service Unavailable")
+        try:
+            # A delta applied twice is not the same as once: no retries
+            response = await internal_http.put(
+                f"{self.base_url}/{product_id}/stock",
+                json={"quantity_delta": quantity_delta},
+                retries=0,
+            )
+            if response.status_code != 200:
+                 logger.error(f"Failed to update stock for {product_id}: {response.text}")
+                 raise HTTPException(status_code=response.status_code, detail="Failed to update stock")
+            return True
+        except httpx.RequestError as e:
+            logger.error(f"Connection error to Inventory Service: {e}")
+            raise HTTPException(status_code=503, detail="Inventory Service Unavailable")
+
+    def stats(self) -> dict:
+        return {"replicas": self.replicas, "hedging": self.hedger.stats(), "cache": product_cache.stats()}
 
 inventory_client = InventoryClient()
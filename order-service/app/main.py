@@ -1,8 +1,19 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from app.orders.api import router as orders_router
+from app.core.deadline import DeadlineMiddleware, DeadlineExceeded
+from app.core.http_client import internal_http
+from app.orders.outbox import outbox_dispatcher
 
 app = FastAPI(title="Order Service")
 
+# Honour the caller's remaining budget (X-Request-Timeout-Ms) on every request
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 app.include_router(orders_router, prefix="/api/v1/orders", tags=["orders"])
 
 @app.on_event("startup")
@@ -11,7 +22,27 @@ async def startup_event():
     from app.db.base import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Pooled keep-alive client for calls to other services
+    internal_http.open()
+    # Delivers order events from the outbox table
+    await outbox_dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await outbox_dispatcher.stop()
+    await internal_http.close()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    from app.core.service_clients import inventory_client
+    from app.core.websocket_manager import manager
+    return {
+        "inventory_client": inventory_client.stats(),
+        "internal_http": internal_http.stats(),
+        "outbox": outbox_dispatcher.stats(),
+        "websockets": manager.stats(),
+    }
@@ -1,24 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Header, Query, BackgroundTasks, WebSocket, WebSocketDisconnect
 from typing import List, Optional
+import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.orders.schemas import OrderCreate, OrderResponse
+from app.orders.schemas import OrderCreate, OrderResponse, OrderStatus
 from app.orders import service as order_service
-from app.auth.dependencies import get_current_user, TokenUser
+from app.auth.dependencies import get_current_user, verify_token, websocket_identity, TokenUser
 from app.ai.service import process_order_ai 
-from app.core.websocket_manager import manager
+from app.core.websocket_manager import manager, parse_topics
+from app.core.deadline import DeadlineExceeded
 
 router = APIRouter()
 
 @router.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+    # ?topics=orders,order:42,user:7,stock:low,dashboard, limited to what the
+    # caller may see (see websocket_manager.topic_allowed); client_id is only a label
+    await manager.connect(
+        websocket,
+        client_id=client_id,
+        topics=parse_topics(websocket.query_params.get("topics")),
+        identity=websocket_identity(websocket),
+    )
     try:
         while True:
-            await websocket.receive_text()
+            # "pong" heartbeats, {"action": "auth"} and subscribe/unsubscribe commands
+            manager.handle_message(websocket, await websocket.receive_text(), verify_token)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@router.post("/internal/product-changes", status_code=204)
+async def product_changes(request: Request):
+    """
+    inventory-service tells us which products changed: drop them from the
+    product cache, and alert "stock:low" / "product:<id>" subscribers.
+    """
+    from app.core.identity import SIGNATURE_HEADER, verify_body
+    from app.core.product_cache import product_cache
+    body = await request.body()
+    if not verify_body(body, request.headers.get(SIGNATURE_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    try:
+        changes = json.loads(body)
+        product_ids = [int(product_id) for product_id in changes["product_ids"]]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Expected {\"product_ids\": [...]}")
+    product_cache.invalidate(product_ids)
+    for low in changes.get("low_stock") or []:
+        manager.publish(["stock:low", f"product:{low['product_id']}"], {"type": "stock.low", **low})
+
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order: OrderCreate, 
@@ -27,6 +57,13 @@ async def create_order(
     db: AsyncSession = Depends(get_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
+    """
+    Stock is reserved and committed before this returns. reservation_status
+    is "committed", or "pending" if inventory-service couldn't be reached in
+    time: the commit is then retried in the background, and the order is
+    cancelled (order.cancelled, reason "stock_unavailable") should the stock
+    be gone by then. Stock that can't be had at all is a 400, with no order.
+    """
     if idempotency_key:
         from app.core import idempotency
         existing_key = await idempotency.get_idempotency_key(db, idempotency_key)
@@ -53,6 +90,8 @@ async def create_order(
         background_tasks.add_task(process_order_ai, new_order.id)
             
         return new_order
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -80,17 +119,29 @@ async def get_order_summary(
 
 @router.get("/", response_model=List[OrderResponse])
 async def list_orders(
-    skip: int = 0, 
-    limit: int = 10, 
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(order_service.ORDERS_PAGE_DEFAULT, ge=1, le=order_service.ORDERS_PAGE_MAX),
+    status: Optional[OrderStatus] = None,
+    user_id: Optional[int] = None,
+    include_total: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: TokenUser = Depends(get_current_user)
 ):
-    # Users can see their own orders. Admins can see all? 
-    # Req says "List orders with pagination".
-    # I'll default to seeing own orders for now.
+    # The body stays a plain list for existing clients; paging goes in headers.
+    # Pass X-Next-Cursor back as ?cursor= for the next (older) page.
     svc = order_service.OrderService(db)
-    # Return ALL orders so the dashboard matches the list.
-    return await svc.list_orders()
+    try:
+        orders, next_cursor, total = await svc.list_orders(
+            user_id=user_id, status=status, cursor=cursor, limit=limit, include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return orders
 
 @router.put("/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Enum, Index, JSON, DateTime
 from sqlalchemy.orm import relationship
 import enum
+from datetime import datetime
 from app.db.base import Base
 
 class OrderStatus(str, enum.Enum):
@@ -19,6 +20,12 @@ class Order(Base):
 
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan", lazy="selectin")
 
+    # Keyset pagination walks id downwards within these filters
+    __table_args__ = (
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        Index("ix_orders_status_id", "status", "id"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
@@ -29,3 +36,30 @@ class OrderItem(Base):
     price_at_purchase = Column(Float, nullable=False)
 
     order = relationship("Order", back_populates="items")
+
+class OutboxEvent(Base):
+    """Order lifecycle event, written in the same transaction as the change itself."""
+    __tablename__ = "order_outbox"
+
+    id = Column(Integer, primary_key=True) # Order of delivery, but ids may commit out of order
+    event_type = Column(String, nullable=False)
+    order_id = Column(Integer, nullable=False, index=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    deliveries = relationship("OutboxDelivery", cascade="all, delete-orphan", lazy="noload")
+
+class OutboxDelivery(Base):
+    """An outbox event owed to one durable consumer, written along with the event."""
+    __tablename__ = "order_outbox_deliveries"
+
+    event_id = Column(Integer, ForeignKey("order_outbox.id"), primary_key=True)
+    consumer = Column(String, primary_key=True)
+    claimed_until = Column(DateTime, nullable=True) # Lease held by the replica delivering it
+    attempts = Column(Integer, default=0, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
+
+    # The dispatcher's "what is still owed to this consumer" scan
+    __table_args__ = (
+        Index("ix_order_outbox_deliveries_pending", "consumer", "delivered_at", "event_id"),
+    )
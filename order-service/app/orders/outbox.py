@@ -0,0 +1,396 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+import httpx
+from sqlalchemy import select, delete, update, func, or_
+from app.core.config import settings
+from app.core.http_client import internal_http
+from app.core.identity import SIGNATURE_HEADER, sign_body
+from app.core.websocket_manager import manager
+from app.db.session import AsyncSessionLocal
+from app.orders.models import Order, OrderStatus, OutboxEvent, OutboxDelivery
+
+logger = logging.getLogger(__name__)
+
+# Transactional outbox: order changes add an OutboxEvent to the same
+# transaction, so an event exists if and only if the change was committed.
+# Ids are handed out before commit, so they can commit out of order: nothing
+# here assumes that everything below the last id seen has been seen. The
+# dispatcher delivers events in batches:
+#  - to every HTTP consumer in OUTBOX_CONSUMERS, as one signed POST
+#    {"events": [...]} per batch. Each event gets an order_outbox_deliveries
+#    row per consumer in its own transaction. A replica claims a batch of
+#    those rows (SKIP LOCKED, then a lease committed before the POST) and
+#    marks them delivered after a 2xx. A failed or abandoned batch goes back
+#    once its lease is released or runs out, so delivery is at-least-once and
+#    only roughly in id order: consumers dedupe on id.
+#  - to this replica's WebSocket clients subscribed to "orders", "order:<id>"
+#    or "user:<id>" (plus a "dashboard" delta), live only (no replay). Ids
+#    skipped over are watched for a while in case they commit late.
+# The same machinery finishes each new order's stock reservation when the
+# request couldn't commit it itself (see ReservationCommitter), so that
+# survives inventory outages and restarts.
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+ORDER_CANCELLED = "order.cancelled"
+
+
+def record(db, event_type: str, order, **data) -> OutboxEvent:
+    """Stage an event for order in db's transaction; the caller commits."""
+    payload = {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "status": getattr(order.status, "value", order.status),
+        "total_amount": order.total_amount,
+        **data,
+    }
+    deliveries = [
+        OutboxDelivery(consumer=consumer.name)
+        for consumer in outbox_dispatcher.consumers
+        if consumer.wants(event_type, payload)
+    ]
+    event = OutboxEvent(event_type=event_type, order_id=order.id, payload=payload, deliveries=deliveries)
+    db.add(event)
+    return event
+
+
+async def settle(db, event_id: int, consumer: str):
+    """Mark event delivered to consumer because the request did the work itself; the caller commits."""
+    await db.execute(
+        update(OutboxDelivery)
+        .where(
+            OutboxDelivery.event_id == event_id,
+            OutboxDelivery.consumer == consumer,
+            OutboxDelivery.delivered_at.is_(None),
+        )
+        .values(delivered_at=datetime.utcnow(), claimed_until=None)
+    )
+
+
+def serialize(event: OutboxEvent) -> dict:
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "order_id": event.order_id,
+        "created_at": event.created_at.isoformat(),
+        "data": event.payload,
+    }
+
+
+DASHBOARD_TOPIC = "dashboard"
+
+
+def topics_for(event: OutboxEvent) -> list:
+    """WebSocket topics an event is published to (see websocket_manager)."""
+    return ["orders", f"order:{event.order_id}", f"user:{event.payload.get('user_id')}"]
+
+
+def dashboard_delta(event: OutboxEvent) -> dict | None:
+    """What the event changes on the dashboard, so viewers needn't re-fetch it."""
+    data = event.payload
+    if event.event_type == ORDER_CREATED:
+        return {"type": "dashboard.delta", "orders": 1, "revenue": data["total_amount"],
+                "status_counts": {data["status"]: 1}}
+    if data.get("previous_status") and data["previous_status"] != data["status"]:
+        return {"type": "dashboard.delta", "status_counts": {data["previous_status"]: -1, data["status"]: 1}}
+    return None
+
+
+def parse_consumers(spec: str) -> dict:
+    consumers = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, url = part.split("=", 1)
+            consumers[name.strip()] = url.strip()
+    return consumers
+
+
+class HTTPConsumer:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.failures = 0
+        self.retry_at = 0.0
+
+        # Metrics
+        self.delivered = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_event_id = None
+
+    def wants(self, event_type: str, payload: dict) -> bool:
+        return True
+
+    async def deliver(self, events: list) -> str | None:
+        """Send one batch: None once the consumer has it, else what went wrong."""
+        body = json.dumps({"consumer": self.name, "events": [serialize(e) for e in events]}).encode()
+        try:
+            response = await internal_http.post(
+                self.url,
+                content=body,
+                headers={"Content-Type": "application/json", SIGNATURE_HEADER: sign_body(body)},
+                idempotent=True, # Consumers dedupe on event id
+                use_deadline=False,
+            )
+        except httpx.RequestError as e:
+            return str(e)
+        return None if response.status_code < 300 else f"HTTP {response.status_code}"
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_event_id": self.last_event_id,
+            "failing": self.failures > 0,
+        }
+
+
+class ReservationCommitter(HTTPConsumer):
+    """
+    Built-in consumer that makes the stock hold of a new order permanent when
+    create_order couldn't (inventory unreachable, or no budget left). Commit
+    is idempotent and inventory-service accepts it late (re-taking the stock
+    if the hold was swept), so it is retried until it lands. Only a definite
+    no (released, or the stock has gone since) cancels the order.
+    """
+
+    NAME = "inventory-reservations"
+
+    def __init__(self, inventory_url: str):
+        super().__init__(self.NAME, inventory_url)
+
+    def wants(self, event_type: str, payload: dict) -> bool:
+        return event_type == ORDER_CREATED and bool(payload.get("reservation_id"))
+
+    async def deliver(self, events: list) -> str | None:
+        for event in events:
+            reservation_id = event.payload["reservation_id"]
+            try:
+                response = await internal_http.post(
+                    f"{self.url}/reservations/{reservation_id}/commit", idempotent=True, use_deadline=False
+                )
+            except httpx.RequestError as e:
+                return str(e)
+            if response.status_code in (404, 409):
+                logger.error(f"Reservation {reservation_id} for order {event.order_id} can't be committed: "
+                             f"{response.json().get('detail')}; cancelling the order")
+                async with AsyncSessionLocal() as db:
+                    await cancel_unstocked(db, event.order_id)
+            elif response.status_code != 200:
+                return f"HTTP {response.status_code}"
+        return None
+
+
+async def cancel_unstocked(db, order_id: int):
+    """Cancel an order whose reservation inventory refused to commit, and commit."""
+    order = await db.get(Order, order_id, populate_existing=True)
+    if order is None or order.status != OrderStatus.CREATED.value:
+        return
+    previous = order.status
+    order.status = OrderStatus.CANCELLED.value
+    record(db, ORDER_CANCELLED, order, previous_status=previous, reason="stock_unavailable")
+    await db.commit()
+    outbox_dispatcher.wake()
+
+
+class OutboxDispatcher:
+    PRUNE_EVERY = 60.0
+    # How long an id skipped by the live feed is watched for a late commit
+    GAP_GRACE = 60.0
+    MAX_GAPS = 10000
+
+    def __init__(self, consumers: list, batch_size: int, poll_interval: float, retry_max_delay: float,
+                 claim_timeout: float, retention_hours: float):
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_max_delay = retry_max_delay
+        self.claim_timeout = timedelta(seconds=claim_timeout)
+        self.retention = timedelta(hours=retention_hours)
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._ws_offset = 0
+        self._ws_gaps: dict = {} # id -> when the live feed skipped over it
+        self._pruned_at = 0.0
+
+        # Metrics
+        self.ws_delivered = 0
+        self.ws_late = 0
+
+    def wake(self):
+        """Call after committing events so they go out without waiting for the poll."""
+        self._wake.set()
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            # Live feed: WebSocket clients only see what happens from now on
+            self._ws_offset = await db.scalar(select(func.coalesce(func.max(OutboxEvent.id), 0)))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            progressed = False
+            try:
+                progressed = await self._dispatch_websocket()
+                now = time.monotonic()
+                for consumer in self.consumers:
+                    if now >= consumer.retry_at:
+                        progressed = await self._dispatch_http(consumer) or progressed
+                if now - self._pruned_at >= self.PRUNE_EVERY:
+                    self._pruned_at = now
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Outbox dispatch failed: {e}")
+
+            if progressed:
+                continue # There may be more behind this batch
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _publish(self, event: OutboxEvent):
+        if not manager.active_connections:
+            return
+        # Live feed: only queued here, slow sockets are the manager's problem
+        self.ws_delivered += manager.publish(topics_for(event), serialize(event))
+        delta = dashboard_delta(event)
+        if delta is not None:
+            manager.publish([DASHBOARD_TOPIC], delta)
+
+    async def _dispatch_websocket(self) -> bool:
+        now = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(OutboxEvent).where(OutboxEvent.id > self._ws_offset).order_by(OutboxEvent.id).limit(self.batch_size)
+            )
+            events = result.scalars().all()
+            late = []
+            if self._ws_gaps:
+                result = await db.execute(select(OutboxEvent).where(OutboxEvent.id.in_(list(self._ws_gaps))))
+                late = sorted(result.scalars().all(), key=lambda e: e.id)
+
+        for event in late:
+            del self._ws_gaps[event.id]
+            self.ws_late += 1
+            self._publish(event)
+        # Still missing after the grace period: rolled back, not coming
+        for event_id, skipped_at in list(self._ws_gaps.items()):
+            if now - skipped_at > self.GAP_GRACE:
+                del self._ws_gaps[event_id]
+
+        for event in events:
+            for missing in range(self._ws_offset + 1, min(event.id, self._ws_offset + 1 + self.MAX_GAPS)):
+                self._ws_gaps.setdefault(missing, now)
+            self._ws_offset = event.id
+            self._publish(event)
+        return bool(events)
+
+    async def _dispatch_http(self, consumer: HTTPConsumer) -> bool:
+        now = datetime.utcnow()
+        lease = now + self.claim_timeout
+        owed = (OutboxDelivery.consumer == consumer.name, OutboxDelivery.delivered_at.is_(None))
+        async with AsyncSessionLocal() as db:
+            # Claim a batch and commit, so no row lock is held while it is out
+            result = await db.execute(
+                select(OutboxEvent)
+                .join(OutboxDelivery, OutboxDelivery.event_id == OutboxEvent.id)
+                .where(*owed, or_(OutboxDelivery.claimed_until.is_(None), OutboxDelivery.claimed_until < now))
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(of=OutboxDelivery, skip_locked=True)
+            )
+            events = result.scalars().all()
+            if not events:
+                await db.rollback()
+                return False
+            claimed = (*owed, OutboxDelivery.event_id.in_([e.id for e in events]))
+            await db.execute(
+                update(OutboxDelivery).where(*claimed).values(claimed_until=lease, attempts=OutboxDelivery.attempts + 1)
+            )
+            await db.commit()
+
+        error = await consumer.deliver(events)
+
+        async with AsyncSessionLocal() as db:
+            if error is None:
+                await db.execute(
+                    update(OutboxDelivery).where(*claimed).values(delivered_at=datetime.utcnow(), claimed_until=None)
+                )
+            else:
+                # Back to the queue, unless our lease ran out and another replica has it now
+                await db.execute(
+                    update(OutboxDelivery).where(*claimed, OutboxDelivery.claimed_until == lease).values(claimed_until=None)
+                )
+            await db.commit()
+
+        if error is not None:
+            consumer.errors += 1
+            consumer.failures += 1
+            delay = min(self.retry_max_delay, 0.5 * 2 ** consumer.failures)
+            consumer.retry_at = time.monotonic() + random.uniform(delay / 2, delay)
+            logger.warning(f"Outbox delivery to {consumer.name} failed ({error}), retrying in {delay:.1f}s")
+            return False
+
+        consumer.failures = 0
+        consumer.delivered += len(events)
+        consumer.batches += 1
+        consumer.last_event_id = events[-1].id
+        return True
+
+    async def _prune(self):
+        """Drop events past retention that no configured consumer is still owed."""
+        async with AsyncSessionLocal() as db:
+            owed = select(OutboxDelivery.event_id).where(
+                OutboxDelivery.delivered_at.is_(None),
+                OutboxDelivery.consumer.in_([consumer.name for consumer in self.consumers]),
+            )
+            expired = select(OutboxEvent.id).where(
+                OutboxEvent.created_at < datetime.utcnow() - self.retention,
+                OutboxEvent.id.not_in(owed),
+            )
+            await db.execute(delete(OutboxDelivery).where(OutboxDelivery.event_id.in_(expired)))
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(expired)))
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "websocket": {
+                "delivered": self.ws_delivered,
+                "last_event_id": self._ws_offset,
+                "late_events": self.ws_late,
+                "watched_gaps": len(self._ws_gaps),
+            },
+            "consumers": {consumer.name: consumer.stats() for consumer in self.consumers},
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(
+    consumers=[
+        ReservationCommitter(settings.INVENTORY_SERVICE_URL.split(",")[0].strip().rstrip("/")),
+        *(HTTPConsumer(name, url) for name, url in parse_consumers(settings.OUTBOX_CONSUMERS).items()),
+    ],
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    retry_max_delay=settings.OUTBOX_RETRY_MAX_DELAY,
+    claim_timeout=settings.OUTBOX_CLAIM_TIMEOUT,
+    retention_hours=settings.OUTBOX_RETENTION_HOURS,
+)
@@ -28,6 +28,10 @@ class OrderResponse(BaseModel):
     status: OrderStatus
     total_amount: float
     items: List[OrderItemResponse]
+    # Only on create: "committed", or "pending" while inventory is retried in
+    # the background; a pending order may still become CANCELLED if its stock
+    # is gone by then (order.cancelled event, reason "stock_unavailable")
+    reservation_status: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -1,102 +1,196 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, func
 from app.orders.models import Order, OrderItem, OrderStatus
 from app.orders.schemas import OrderCreate
+from app.orders import outbox
+from app.orders.outbox import outbox_dispatcher
+from app.core.http_client import internal_http
+from app.core.deadline import DeadlineExceeded
+import base64
 import httpx
+import json
+import logging
 import os
 
-INVENTORY_SERVICE_URL = os.getenv("INVENTORY_SERVICE_URL", "http://inventory-service:8000/api/v1/inventory")
+# May list several replicas (used for hedged reads by InventoryClient); writes go to the first
+INVENTORY_SERVICE_URL = os.getenv("INVENTORY_SERVICE_URL", "http://inventory-service:8000/api/v1/inventory").split(",")[0].strip().rstrip("/")
+# Stock is held this long between reserve and commit before the sweeper puts it back
+RESERVATION_TTL_SECONDS = int(os.getenv("ORDER_RESERVATION_TTL_SECONDS", "60"))
+# Order listing page sizes
+ORDERS_PAGE_DEFAULT = int(os.getenv("ORDERS_PAGE_DEFAULT", "20"))
+ORDERS_PAGE_MAX = int(os.getenv("ORDERS_PAGE_MAX", "100"))
+
+# What create_order reports as the order's reservation_status
+RESERVATION_COMMITTED = "committed"
+RESERVATION_PENDING = "pending" # Inventory didn't answer in time; the outbox keeps trying
+
+logger = logging.getLogger(__name__)
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """The id to continue below; ValueError for anything we didn't issue."""
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
 
 class OrderService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def _check_stock(self, product_id: int, quantity: int):
-        async with httpx.AsyncClient() as client:
-            try:
-                # Get product details
-                resp = await client.get(f"{INVENTORY_SERVICE_URL}/{product_id}")
-                if resp.status_code != 200:
-                    raise Exception(f"Product {product_id} not found")
-                
-                product = resp.json()
-                if product['stock_quantity'] < quantity:
-                     raise Exception(f"Insufficient stock for product {product_id}")
-                
-                return product
-            except httpx.RequestError:
-                 raise Exception("Inventory service unavailable")
-
-    async def _deduct_stock(self, product_id: int, quantity: int):
-        async with httpx.AsyncClient() as client:
-            # We need a dedicated endpoint for stock deduction in inventory service
-            # For MVP restoration, we might just update quantity via PUT? 
-            # Ideally: POST /inventory/{id}/deduct
-            # Let's assume we use the update endpoint for now or add a specific one.
-            # To be safe and quick, we'll try to update.
-            # BUT, we need to KNOW current stock to update it properly via PUT.
-            # This is race-condition prone without atomic endpoint.
-            # For this task, we will assume a simple endpoint exists or we add it.
-            # proper way: 
-            payload = {"quantity": quantity}
-            resp = await client.post(f"{INVENTORY_SERVICE_URL}/{product_id}/deduct", json=payload)
-            if resp.status_code != 200:
-                raise Exception("Failed to deduct stock")
+    async def _reserve(self, items) -> dict:
+        """Hold stock for every line in one atomic call; returns the reservation."""
+        try:
+            resp = await internal_http.post(
+                f"{INVENTORY_SERVICE_URL}/reservations/",
+                json={
+                    "items": [{"product_id": item.product_id, "quantity": item.quantity} for item in items],
+                    "ttl_seconds": RESERVATION_TTL_SECONDS,
+                },
+            )
+        except httpx.RequestError:
+            raise Exception("Inventory service unavailable")
+
+        if resp.status_code in (404, 409):
+            # "Product X not found" / "Insufficient stock for product X"
+            raise Exception(resp.json()["detail"])
+        if resp.status_code != 201:
+            raise Exception("Failed to reserve stock")
+        return resp.json()
+
+    async def _commit_reservation(self, reservation_id: str) -> tuple[str, str | None]:
+        """
+        Make the hold permanent within the request's budget: (status, detail),
+        status being "committed", "pending" (try again later) or "refused".
+        """
+        try:
+            resp = await internal_http.post(
+                f"{INVENTORY_SERVICE_URL}/reservations/{reservation_id}/commit", idempotent=True
+            )
+        except (httpx.RequestError, DeadlineExceeded) as e:
+            logger.warning(f"Commit of reservation {reservation_id} deferred to the outbox: {e!r}")
+            return RESERVATION_PENDING, None
+        if resp.status_code in (404, 409):
+            return "refused", resp.json().get("detail")
+        if resp.status_code != 200:
+            logger.warning(f"Commit of reservation {reservation_id} deferred to the outbox: HTTP {resp.status_code}")
+            return RESERVATION_PENDING, None
+        return RESERVATION_COMMITTED, None
+
+    async def _release_reservation(self, reservation_id: str):
+        # Best effort: the sweeper returns the stock when the hold expires anyway
+        try:
+            await internal_http.post(
+                f"{INVENTORY_SERVICE_URL}/reservations/{reservation_id}/release", idempotent=True, use_deadline=False
+            )
+        except httpx.RequestError as e:
+            logger.warning(f"Release of reservation {reservation_id} failed: {e}")
 
     async def create_order(self, user_id: int, order_data: OrderCreate):
-        # 1. Validate Stock (Call Inventory Service)
-        total_amount = 0.0
-        product_cache = {}
-        
-        for item in order_data.items:
-             product = await self._check_stock(item.product_id, item.quantity)
-             total_amount += product['price'] * item.quantity
-             product_cache[item.product_id] = product
-
-        # 2. Create Order
-        db_order = Order(user_id=user_id, total_amount=total_amount, status=OrderStatus.CREATED)
-        self.db.add(db_order)
-        await self.db.flush() # Get ID
-
-        # 3. Create Items & Deduct Stock
-        for item in order_data.items:
-            product = product_cache[item.product_id]
-            db_item = OrderItem(
-                order_id=db_order.id, 
-                product_id=item.product_id, 
-                quantity=item.quantity,
-                price_at_purchase=product['price']
+        """
+        Reserve, record the order, then commit the reservation in the same
+        request. The returned order's reservation_status is "committed", or
+        "pending" when inventory couldn't be reached in time: the outbox then
+        retries the commit, and cancels the order (order.cancelled, reason
+        "stock_unavailable") only if the stock turns out to be gone.
+        """
+        # 1. Reserve stock for all lines at once (all or nothing)
+        reservation = await self._reserve(order_data.items)
+        prices = {line["product_id"]: line["price"] for line in reservation["items"]}
+
+        try:
+            # 2. Create Order & Items
+            total_amount = sum(prices[item.product_id] * item.quantity for item in order_data.items)
+            db_order = Order(user_id=user_id, total_amount=total_amount, status=OrderStatus.CREATED)
+            self.db.add(db_order)
+            await self.db.flush() # Get ID
+
+            # All lines in one executemany (multi-row INSERT), however many there are
+            await self.db.execute(insert(OrderItem), [
+                {
+                    "order_id": db_order.id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "price_at_purchase": prices[item.product_id],
+                }
+                for item in order_data.items
+            ])
+            # Also owes inventory-service the reservation commit. Step 3 normally
+            # does it; if it can't, the outbox retries it, so it can't be lost
+            created = outbox.record(
+                self.db, outbox.ORDER_CREATED, db_order,
+                items=[{"product_id": item.product_id, "quantity": item.quantity} for item in order_data.items],
+                reservation_id=reservation["id"],
             )
-            self.db.add(db_item)
-            # Distributed Transaction Risk! If this fails, we have inconsistency. 
-            # In real system: Saga pattern. Here: Best effort.
-            await self._deduct_stock(item.product_id, item.quantity)
-            
-        await self.db.commit()
+
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            await self._release_reservation(reservation["id"])
+            raise
+
+        # 3. Make the hold permanent now, while the caller is still waiting
+        reservation_status, detail = await self._commit_reservation(reservation["id"])
+        if reservation_status != RESERVATION_PENDING:
+            await outbox.settle(self.db, created.id, outbox.ReservationCommitter.NAME)
+            await self.db.commit()
+        if reservation_status == "refused":
+            # The hold was swept and the stock sold since: no order after all
+            await outbox.cancel_unstocked(self.db, db_order.id)
+            raise Exception(detail or "Stock is no longer available")
+        outbox_dispatcher.wake()
+
         await self.db.refresh(db_order)
+        db_order.reservation_status = reservation_status
         return db_order
 
     async def get_order(self, order_id: int):
         result = await self.db.execute(select(Order).where(Order.id == order_id))
         return result.scalar_one_or_none()
     
-    async def list_orders(self, user_id: int = None):
-         # Internal Tool: Show all orders if user_id is not specified (or always)
-         # For this specific "Production Level" request, we want global visibility.
-         stmt = select(Order).order_by(Order.id.desc())
-         if user_id:
-             # Optional: Assert user is admin? For now, let's just show all.
-             pass 
-         
-         result = await self.db.execute(stmt)
-         return result.scalars().all()
+    async def list_orders(self, user_id: int = None, status: OrderStatus = None, cursor: str = None,
+                          limit: int = ORDERS_PAGE_DEFAULT, include_total: bool = False):
+        """
+        One page of orders, newest first: (orders, next_cursor, total).
+        Keyset on id, so every page costs the same however deep it is;
+        total is a separate COUNT and only computed when asked for.
+        """
+        # Internal Tool: all orders are visible; user_id is just a filter
+        filters = []
+        if user_id is not None:
+            filters.append(Order.user_id == user_id)
+        if status is not None:
+            filters.append(Order.status == status.value)
+
+        stmt = select(Order).where(*filters)
+        if cursor:
+            stmt = stmt.where(Order.id < decode_cursor(cursor))
+        limit = max(1, min(limit, ORDERS_PAGE_MAX))
+        # One extra row tells whether there is a next page
+        result = await self.db.execute(stmt.order_by(Order.id.desc()).limit(limit + 1))
+        orders = result.scalars().all()
+        next_cursor = encode_cursor(orders[limit - 1].id) if len(orders) > limit else None
+
+        total = None
+        if include_total:
+            total = await self.db.scalar(select(func.count()).select_from(Order).where(*filters))
+        return orders[:limit], next_cursor, total
 
     async def update_order_status(self, order_id: int, status: OrderStatus):
         order = await self.get_order(order_id)
         if not order:
              return None
         
+        previous = order.status
         order.status = status
+        event_type = outbox.ORDER_CANCELLED if status == OrderStatus.CANCELLED else outbox.ORDER_STATUS_CHANGED
+        outbox.record(self.db, event_type, order, previous_status=getattr(previous, "value", previous))
         await self.db.commit()
+        outbox_dispatcher.wake()
         await self.db.refresh(order)
         return order
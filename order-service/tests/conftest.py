@@ -0,0 +1,80 @@
+import asyncio
+import os
+import tempfile
+
+# Settings are read at import time, so these must be in place before any app module loads
+_db_dir = tempfile.mkdtemp(prefix="order-service-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/orders.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("AUTH_SERVICE_URL", "http://auth.test")
+os.environ.setdefault("INVENTORY_SERVICE_URL", "http://inventory.test/api/v1/inventory")
+os.environ.setdefault("ENABLE_AI", "false")
+
+import httpx
+import pytest
+from app.db.base import Base
+from app.db.session import engine
+from app.orders import models as _models # noqa: F401 (registers the tables)
+
+
+@pytest.fixture
+def run_db():
+    """Run a coroutine against a fresh schema; the engine is disposed after each loop."""
+
+    def run(coro_fn):
+        async def wrapper():
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                return await coro_fn()
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(wrapper())
+
+    return run
+
+
+class FakeInventory:
+    """
+    Stands in for inventory-service behind internal_http.post. Set
+    commit_result to a status code, or to an exception class to raise.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.reserve_status = 201
+        self.reserve_detail = None
+        self.commit_result = 200
+        self.prices = {}
+
+    async def post(self, url, json=None, **kwargs):
+        self.calls.append(url)
+        request = httpx.Request("POST", url)
+        if url.endswith("/reservations/"):
+            if self.reserve_status != 201:
+                return httpx.Response(self.reserve_status, json={"detail": self.reserve_detail}, request=request)
+            items = [
+                {"product_id": line["product_id"], "quantity": line["quantity"],
+                 "price": self.prices.get(line["product_id"], 1.0)}
+                for line in json["items"]
+            ]
+            return httpx.Response(201, json={"id": "res-1", "status": "held", "items": items}, request=request)
+        if url.endswith("/commit"):
+            if isinstance(self.commit_result, type):
+                raise self.commit_result("inventory unreachable", request=request)
+            body = {"detail": "Reservation is expired"} if self.commit_result in (404, 409) else {}
+            return httpx.Response(self.commit_result, json=body, request=request)
+        return httpx.Response(200, json={}, request=request)
+
+    def posted(self, suffix: str) -> int:
+        return sum(1 for url in self.calls if url.endswith(suffix))
+
+
+@pytest.fixture
+def inventory(monkeypatch):
+    from app.core.http_client import internal_http
+    fake = FakeInventory()
+    monkeypatch.setattr(internal_http, "post", fake.post)
+    return fake
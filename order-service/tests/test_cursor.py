@@ -0,0 +1,54 @@
+import base64
+import json
+import pytest
+from app.orders.models import Order
+from app.orders.service import OrderService, decode_cursor, encode_cursor
+from app.db.session import AsyncSessionLocal
+
+
+def test_cursor_round_trip():
+    for last_id in (1, 42, 10 ** 12):
+        assert decode_cursor(encode_cursor(last_id)) == last_id
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(123456)
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not-base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(json.dumps({"offset": 3}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"id": "7"}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([7]).encode()).decode(),
+])
+def test_cursor_rejects_anything_not_issued(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_list_orders_pages_newest_first(run_db):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            for user_id in (1, 2, 1, 1, 2):
+                db.add(Order(user_id=user_id, total_amount=1.0, status="CREATED"))
+            await db.commit()
+
+            svc = OrderService(db)
+            pages, cursor = [], None
+            while True:
+                orders, cursor, total = await svc.list_orders(cursor=cursor, limit=2, include_total=True)
+                pages.append([order.id for order in orders])
+                if cursor is None:
+                    break
+            mine, mine_cursor, _ = await svc.list_orders(user_id=1, limit=5)
+            return pages, total, [order.id for order in mine], mine_cursor
+
+    pages, total, mine, mine_cursor = run_db(scenario)
+    assert pages == [[5, 4], [3, 2], [1]]
+    assert total == 5
+    assert mine == [4, 3, 1]
+    assert mine_cursor is None
@@ -0,0 +1,126 @@
+import httpx
+import pytest
+from sqlalchemy import select
+from app.db.session import AsyncSessionLocal
+from app.orders import outbox
+from app.orders.models import Order, OrderItem, OutboxDelivery, OutboxEvent
+from app.orders.schemas import OrderCreate
+from app.orders.service import OrderService
+
+ORDER = OrderCreate(items=[{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}])
+
+
+async def _create(order=ORDER):
+    async with AsyncSessionLocal() as db:
+        return await OrderService(db).create_order(user_id=7, order_data=order)
+
+
+async def _state():
+    async with AsyncSessionLocal() as db:
+        orders = (await db.execute(select(Order))).scalars().all()
+        events = (await db.execute(select(OutboxEvent).order_by(OutboxEvent.id))).scalars().all()
+        committer = (await db.execute(
+            select(OutboxDelivery).where(OutboxDelivery.consumer == outbox.ReservationCommitter.NAME)
+        )).scalars().all()
+        return (
+            [(order.id, order.status) for order in orders],
+            [event.event_type for event in events],
+            [delivery.delivered_at is not None for delivery in committer],
+        )
+
+
+def test_order_commits_its_reservation_before_returning(run_db, inventory):
+    inventory.prices = {1: 2.5, 2: 10.0}
+
+    async def scenario():
+        order = await _create()
+        async with AsyncSessionLocal() as db:
+            items = (await db.execute(select(OrderItem).order_by(OrderItem.product_id))).scalars().all()
+        return order, [(i.product_id, i.price_at_purchase) for i in items], await _state()
+
+    order, items, (orders, events, settled) = run_db(scenario)
+    assert order.reservation_status == "committed"
+    assert order.total_amount == 15.0 # Priced from the reservation, not the client
+    assert items == [(1, 2.5), (2, 10.0)]
+    assert orders == [(order.id, "CREATED")]
+    assert events == [outbox.ORDER_CREATED]
+    assert settled == [True] # Nothing left for the outbox to retry
+    assert inventory.posted("/reservations/res-1/commit") == 1
+
+
+def test_unreachable_inventory_leaves_the_commit_to_the_outbox(run_db, inventory):
+    inventory.commit_result = httpx.ConnectError
+
+    async def scenario():
+        order = await _create()
+        return order, await _state()
+
+    order, (orders, events, settled) = run_db(scenario)
+    assert order.reservation_status == "pending"
+    assert orders == [(order.id, "CREATED")]
+    assert settled == [False]
+
+
+def test_refused_commit_cancels_the_order_and_fails_the_request(run_db, inventory):
+    inventory.commit_result = 409
+
+    async def scenario():
+        with pytest.raises(Exception, match="Reservation is expired"):
+            await _create()
+        return await _state()
+
+    orders, events, settled = run_db(scenario)
+    assert [status for _, status in orders] == ["CANCELLED"]
+    assert events == [outbox.ORDER_CREATED, outbox.ORDER_CANCELLED]
+    assert settled == [True]
+
+
+def test_failed_reserve_creates_nothing(run_db, inventory):
+    inventory.reserve_status = 409
+    inventory.reserve_detail = "Insufficient stock for product 1"
+
+    async def scenario():
+        with pytest.raises(Exception, match="Insufficient stock for product 1"):
+            await _create()
+        return await _state()
+
+    assert run_db(scenario) == ([], [], [])
+    assert inventory.posted("/commit") == 0
+
+
+def test_failure_after_reserving_releases_the_hold(run_db, inventory, monkeypatch):
+    def broken_record(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(outbox, "record", broken_record)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await _create()
+        return await _state()
+
+    assert run_db(scenario) == ([], [], [])
+    assert inventory.posted("/reservations/res-1/release") == 1
+    assert inventory.posted("/commit") == 0
+
+
+def test_committer_retries_transient_failures_and_cancels_on_refusal(run_db, inventory):
+    committer = outbox.ReservationCommitter("http://inventory.test/api/v1/inventory")
+
+    async def scenario():
+        inventory.commit_result = httpx.ConnectError
+        await _create()
+        async with AsyncSessionLocal() as db:
+            event = (await db.execute(select(OutboxEvent))).scalars().one()
+
+        results = []
+        for status in (httpx.ConnectError, 503, 409):
+            inventory.commit_result = status
+            results.append(await committer.deliver([event]))
+        return results, await _state()
+
+    (unreachable, unavailable, refused), (orders, events, _) = run_db(scenario)
+    assert unreachable is not None and unavailable == "HTTP 503" # Left owed, retried later
+    assert refused is None # Settled: the order is cancelled instead
+    assert [status for _, status in orders] == ["CANCELLED"]
+    assert events == [outbox.ORDER_CREATED, outbox.ORDER_CANCELLED]
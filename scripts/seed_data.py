@@ -29,28 +29,14 @@ def seed():
         print(f"!!! Error creating user: {e}")
         return
 
-    # 2. Create Suppliers (New)
-    print("\n2. Creating Suppliers...")
-    supplier_ids = []
+    # 2-4. Suppliers, products and orders go through the gateway's batch
+    # endpoint: one round trip, independent calls run concurrently and
+    # "{{id.body.field}}" pulls ids out of earlier results.
+    print("\n2. Creating Suppliers, Inventory and Seed Orders (batched)...")
     suppliers = [
         {"name": "Global Tech Imports", "contact_email": "supply@globaltech.com"},
         {"name": "Local widgets Co", "contact_email": "widgets@local.com"}
     ]
-    
-    for s in suppliers:
-        # We don't have a lookup endpoint easily, so just try create.
-        # In real app, we'd check existence. Here we just POST.
-        # If duplicated, might fail if unique constraint? We didn't add unique to name.
-        resp = requests.post(f"{BASE_URL}/suppliers/", json=s, headers=headers)
-        if resp.status_code in [200, 201]:
-             supplier_ids.append(resp.json()['id'])
-             print(f"   Created Supplier: {s['name']}")
-        else:
-             # Assume exists or error
-             print(f"   Skipped Supplier {s['name']} (Status {resp.status_code})")
-
-    # 3. Create Products
-    print("\n3. Creating Inventory...")
     products = [
         {"name": "AI Processor Unit", "price": 45000.0, "stock_quantity": 50, "description": "High performance AI chip"},
         {"name": "Quantum Sensor", "price": 12000.0, "stock_quantity": 5, "description": "Precision sensor"},
@@ -58,38 +44,36 @@ def seed():
         {"name": "Neural Interface Headset", "price": 8500.0, "stock_quantity": 100, "description": "Brain-computer interface"},
         {"name": "Smart Battery Pack", "price": 1500.0, "stock_quantity": 200, "description": "Long life energy source"}
     ]
+    # (product index, quantity) per order
+    orders_data = [
+        [(0, 2), (4, 10)],
+        [(1, 1)],
+        [(2, 2)],
+        [(3, 5)]
+    ]
 
-    product_ids = []
+    batch = []
+    for i, s in enumerate(suppliers):
+        batch.append({"id": f"supplier{i}", "method": "POST", "path": "/api/v1/suppliers/", "body": s})
     for i, p in enumerate(products):
         # Assign supplier round-robin
-        if supplier_ids:
-            p['supplier_id'] = supplier_ids[i % len(supplier_ids)]
-            
-        resp = requests.post(f"{BASE_URL}/inventory/", json=p, headers=headers)
-        if resp.status_code == 200:
-            product_ids.append(resp.json()['id'])
-            print(f"   Created: {p['name']}")
-        else:
-            print(f"   Failed to create {p['name']}: {resp.status_code} - {resp.text}")
+        p = dict(p, supplier_id=f"{{{{supplier{i % len(suppliers)}.body.id}}}}")
+        batch.append({"id": f"product{i}", "method": "POST", "path": "/api/v1/inventory/", "body": p})
+    for i, items in enumerate(orders_data):
+        order = {"items": [{"product_id": f"{{{{product{p}.body.id}}}}", "quantity": q} for p, q in items]}
+        batch.append({"id": f"order{i}", "method": "POST", "path": "/api/v1/orders/", "body": order})
 
-    # 4. Create Orders
-    print("\n4. Creating Seed Orders...")
-    orders_data = [
-        {"items": [{"product_id": product_ids[0], "quantity": 2}, {"product_id": product_ids[4], "quantity": 10}]},
-        {"items": [{"product_id": product_ids[1], "quantity": 1}]},
-        {"items": [{"product_id": product_ids[2], "quantity": 2}]},
-        {"items": [{"product_id": product_ids[3], "quantity": 5}]}
-    ]
+    resp = requests.post(f"{BASE_URL}/batch", json={"requests": batch}, headers=headers)
+    if resp.status_code != 200:
+        print(f"!!! Batch failed: {resp.status_code} - {resp.text}")
+        return
 
-    for order in orders_data:
-        try:
-            resp = requests.post(f"{BASE_URL}/orders/", json=order, headers=headers)
-            if resp.status_code == 200:
-                print(f"   Created Order ID: {resp.json()['id']}")
-            else:
-                 print(f"   Failed Order: {resp.text}")
-        except IndexError:
-            pass
+    for result in resp.json()["responses"]:
+        body = result["body"]
+        if result["status"] in [200, 201]:
+            print(f"   Created {result['id']}: {body.get('name', body.get('id'))}")
+        else:
+            print(f"   Failed {result['id']}: {result['status']} - {body}")
 
     print("\n--- Seeding Complete ---")
     print(f"Admin Credentials: admin@example.com / adminpassword")